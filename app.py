@@ -4,26 +4,319 @@ import psutil
 import numpy as np
 import pyarrow as pa
 import logging
-import aiohttp
 import polars as pl
-import pandas as pd
 import asyncio
 from hypersync import LogSelection, LogField, DataType, FieldSelection, ColumnMapping, TransactionField, ClientConfig, JoinMode, TransactionSelection
 import hypersync
-from quart import Quart, request, render_template
-from matplotlib.patches import Patch
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
+from quart import Quart, Response, request, render_template, make_response
 import time
 import shutil
+import tempfile
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
 import pyarrow.parquet as pq
 import os
 import base64
+import fcntl
+import hashlib
 import io
-import matplotlib
-matplotlib.use('Agg')
+import json
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 CHAIN_DATA = {}
+# The chain registry is loaded before serving and refreshed in the background.
+# The last copy is kept on disk so new workers can serve without waiting on it.
+CHAIN_REGISTRY_TTL_SECONDS = float(
+    os.environ.get('CHAIN_REGISTRY_TTL_SECONDS', '600'))
+CHAIN_REGISTRY_PATH = 'data/chains.json'
+_chain_data_refresh = None
+
+# Shared upstream connections: one HTTP session and one Hypersync client per network
+HTTP_TIMEOUT_SECONDS = float(os.environ.get('HTTP_TIMEOUT_SECONDS', '30'))
+HYPERSYNC_CLIENTS = {}
+_http_session = None
+
+# Fetches currently running upstream, keyed by (network, request_type, address).
+# Concurrent requests for the same dataset await the same task instead of
+# starting their own collect_parquet into the shared temp directory.
+INFLIGHT_FETCHES = {}
+DATASET_LOCKS = {}
+# Progress callbacks for every caller waiting on an in-flight fetch
+FETCH_LISTENERS = {}
+
+# Comment lines sent on idle event streams so proxies don't drop them
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+
+# Several serving processes (hypercorn --workers, or SERVE_WORKERS with
+# `python app.py`) can share one data/ directory. Dataset writes, the cache
+# index and the timestamp index are coordinated with fcntl locks in LOCK_DIR
+# and files are published by atomic rename. One worker at a time holds the
+# leader lock and runs cache eviction and the warm cache scheduler.
+SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', '1'))
+LOCK_DIR = 'data/_locks'
+FILE_LOCK_POLL_SECONDS = float(
+    os.environ.get('FILE_LOCK_POLL_SECONDS', '0.05'))
+_leader_lock = None
+# Set once startup is done; /ready reports 503 until then
+_ready = False
+
+# CPU-heavy work (rendering, parquet sort/merge) runs in a process pool so the
+# event loop only does I/O. Set PROCESS_POOL_WORKERS=0 to run it in a thread.
+# The CPUs are split between serving workers by default.
+PROCESS_POOL_WORKERS = int(os.environ.get(
+    'PROCESS_POOL_WORKERS', max(1, (os.cpu_count() or 1) // SERVE_WORKERS)))
+PROCESS_POOL_MAX_QUEUE = int(os.environ.get('PROCESS_POOL_MAX_QUEUE', '16'))
+# Read-only tasks (binning, rendering) give up after PROCESS_POOL_TASK_TIMEOUT.
+# Tasks that change dataset files pass timeout=None: their caller holds the
+# dataset lock and must not drop it while the work is still running.
+PROCESS_POOL_TASK_TIMEOUT = float(
+    os.environ.get('PROCESS_POOL_TASK_TIMEOUT', '600'))
+
+_process_pool = None
+_process_pool_slots = None
+
+# Collected rows are sorted by external merge sort: runs of at most
+# SORT_RUN_ROWS rows are sorted in memory and spilled, then merged reading
+# SORT_MERGE_BATCH_ROWS rows per run at a time, so peak memory is bounded by
+# these two settings rather than by the size of the collected range.
+SORT_RUN_ROWS = int(os.environ.get('SORT_RUN_ROWS', '5000000'))
+SORT_MERGE_BATCH_ROWS = int(os.environ.get('SORT_MERGE_BATCH_ROWS', '65536'))
+
+# Datasets are stored as immutable, block-range sorted parquet segments listed
+# in a manifest. Runs of small segments are merged in the background once there
+# are enough of them; replaced files are kept for a grace period so readers
+# holding an older manifest can still finish.
+SEGMENT_COMPACT_MAX_ROWS = int(
+    os.environ.get('SEGMENT_COMPACT_MAX_ROWS', '1000000'))
+SEGMENT_COMPACT_MIN_SEGMENTS = int(
+    os.environ.get('SEGMENT_COMPACT_MIN_SEGMENTS', '8'))
+SEGMENT_RETIRE_GRACE_SECONDS = int(
+    os.environ.get('SEGMENT_RETIRE_GRACE_SECONDS', '600'))
+
+# Bump when the manifest layout changes; older manifests are upgraded on load
+MANIFEST_SCHEMA_VERSION = 2
+
+# 'rows' keeps one row per log/transaction. 'compact' keeps sorted
+# (block_number, count) pairs with delta-encoded block numbers, which is all
+# the density views need. The format is fixed per dataset when it is created.
+DENSITY_STORAGE_FORMAT = os.environ.get('DENSITY_STORAGE_FORMAT', 'rows')
+
+# Event datasets collected with topic0 for a per-signature breakdown are kept
+# under their own request type. They always use 'rows' storage; parquet
+# dictionary-encodes the topic0 column, so each row costs an index rather
+# than a 66-character hash.
+SIGNATURE_REQUEST_TYPE = 'topic0'
+SIGNATURE_TOP_N = int(os.environ.get('SIGNATURE_TOP_N', '8'))
+KNOWN_EVENT_SIGNATURES = {
+    '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef': 'Transfer',
+    '0x8c5be1e5ebec7d5bd14f71427d1e84f3dd0314c0f7b2291e5b200ac8c7c3b925': 'Approval',
+    '0x17307eab39ab6107e8899845ad3d59bd9653f200f220920489ca2b5937696c31': 'ApprovalForAll',
+    '0xc3d58168c5ae7397731d063d5bbf3d657854427343f4c083240f7aacaa2d0f62': 'TransferSingle',
+    '0x4a39dc06d4c0dbc64b70af90fd698a233a518aa5d07e595d983b8c0526c8f7fb': 'TransferBatch',
+    '0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1': 'Sync',
+    '0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822': 'Swap (V2)',
+    '0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67': 'Swap (V3)',
+    '0x4c209b5fc8ad50758f13e2e1088ba56a560dff690a1c6fef26394f4c03821c4f': 'Mint (V2)',
+    '0xdccd412f0b1252819cb1fd330b93224ca42612892bb3f4f789976e6d81936496': 'Burn (V2)',
+    '0x7a53080ba414158be7ec69b987b5fb7d07dee101fe85488f0853ae16239d0bde': 'Mint (V3)',
+    '0x0c396cd989a39f4459b5fa1aed6a9a8dcdbc45908acfd67e028cd568da98982c': 'Burn (V3)',
+    '0x70935338e69775456a85ddef226c395fb668b63fa0115f5f20610b388e6ca9c0': 'Collect (V3)',
+    '0xe1fffcc4923d04b559f4d29a8bfc6cda04eb5b0d3c460751c2402c5c5cc9109c': 'Deposit',
+    '0x7fcf532c15f0a6db0bd6d0e038bea71d30d808c7d98cb3bf7268a95bf5081b65': 'Withdrawal',
+    '0x8be0079c531659141344cd1fd0a4f28419497f9722a3daafe3b4186f6b6457e0': 'OwnershipTransferred',
+}
+
+# Every dataset keeps per-bucket counts at power-of-two bucket sizes from
+# 2**PYRAMID_MIN_LEVEL to 2**PYRAMID_MAX_LEVEL blocks, so any zoom window can
+# be answered from a few thousand pre-aggregated rows
+PYRAMID_MIN_LEVEL = int(os.environ.get('PYRAMID_MIN_LEVEL', '8'))
+PYRAMID_MAX_LEVEL = int(os.environ.get('PYRAMID_MAX_LEVEL', '24'))
+DENSITY_MAX_BINS = int(os.environ.get('DENSITY_MAX_BINS', '5000'))
+PYRAMID_OVERSAMPLE_BITS = int(os.environ.get('PYRAMID_OVERSAMPLE_BITS', '4'))
+
+# Rendered plots are cached by dataset version and render options, first in
+# memory and then on disk, each with its own size budget and LRU eviction
+RENDER_CACHE_MEMORY_BYTES = int(
+    os.environ.get('RENDER_CACHE_MEMORY_MB', '64')) * 1024 * 1024
+RENDER_CACHE_DISK_BYTES = int(
+    os.environ.get('RENDER_CACHE_DISK_MB', '512')) * 1024 * 1024
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', 'data/_render_cache')
+# Bump when create_plot output changes so stale renders aren't served
+RENDER_OPTIONS = ('png', 30, 15, 120, 1)
+
+# The fast renderer (/api/plot) draws the same chart with numpy and Pillow
+# and serves it as a binary image. Presets are (width, height, scale); scale
+# plays the role of DPI for fonts and line widths, 0 drops all text.
+FAST_RENDER_PRESETS = {
+    'thumbnail': (320, 160, 0),
+    'small': (800, 400, 1),
+    'medium': (1600, 800, 2),
+    'large': (3600, 1800, 4),
+}
+FAST_RENDER_FORMATS = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml',
+}
+# Bump when the fast renderer output changes
+FAST_RENDER_VERSION = 1
+FAST_RENDER_COLORS = {
+    'bar': (255, 130, 108),  # Envio burnt orange at 80% over white
+    'max_bar': (229, 62, 62),
+    'line': (42, 67, 101),
+    'grid': (229, 231, 235),
+    'text': (55, 65, 81),
+}
+# Stacked signature segments, matplotlib's tab10 like the full plot
+FAST_RENDER_SIGNATURE_COLORS = [
+    (31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189),
+    (140, 86, 75), (227, 119, 194), (127, 127, 127), (188, 189, 34), (23, 190, 207),
+]
+
+# Per-chain block -> timestamp index for time bucketing. Every
+# TIMESTAMP_INDEX_STRIDE-th block's timestamp is stored as a little-endian
+# uint32 in one flat file per chain, memory-mapped by every worker and
+# extended from HyperSync block headers as the chain grows. Blocks between
+# samples are interpolated.
+TIMESTAMP_INDEX_DIR = os.environ.get('TIMESTAMP_INDEX_DIR', 'data/_timestamps')
+TIMESTAMP_INDEX_STRIDE = int(os.environ.get('TIMESTAMP_INDEX_STRIDE', '16'))
+# Headers are collected TIMESTAMP_INDEX_FETCH_BLOCKS blocks at a time, so
+# indexing a long chain never holds more than one range of headers
+TIMESTAMP_INDEX_FETCH_BLOCKS = int(
+    os.environ.get('TIMESTAMP_INDEX_FETCH_BLOCKS', '1000000'))
+TIME_BUCKETS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+TIMESTAMP_INDEX_FETCHES = {}
+
+# Per-block analytics (percentiles, busiest blocks, idle gaps) are computed
+# in one pass and stored next to the dataset until its data changes
+ANALYTICS_TOP_K = int(os.environ.get('ANALYTICS_TOP_K', '10'))
+
+# Cold fetches split [start_block, head] into block ranges that are collected
+# concurrently. Each shard becomes its own segment, in block order, so no
+# global re-sort is needed. Ranges shorter than FETCH_SHARD_MIN_BLOCKS
+# aren't split further.
+FETCH_SHARDS = int(os.environ.get('FETCH_SHARDS', '1'))
+FETCH_SHARD_CONCURRENCY = int(
+    os.environ.get('FETCH_SHARD_CONCURRENCY', str(FETCH_SHARDS)))
+FETCH_SHARD_MIN_BLOCKS = int(
+    os.environ.get('FETCH_SHARD_MIN_BLOCKS', '500000'))
+# While anyone is listening for progress, each shard is collected in
+# sequential chunks of FETCH_PROGRESS_BLOCKS so blocks and rows are reported
+# during the fetch rather than once the shard completes
+FETCH_PROGRESS_BLOCKS = int(
+    os.environ.get('FETCH_PROGRESS_BLOCKS', '1000000'))
+
+# Largest number of addresses accepted by one /api/batch request
+BATCH_MAX_ADDRESSES = int(os.environ.get('BATCH_MAX_ADDRESSES', '100'))
+
+# /api/compare fans out over networks with at most COMPARE_MAX_CONCURRENCY
+# fetches at once; a chain that takes longer than its timeout is reported as
+# pending while its fetch keeps filling the cache in the background
+COMPARE_MAX_NETWORKS = int(os.environ.get('COMPARE_MAX_NETWORKS', '25'))
+COMPARE_MAX_CONCURRENCY = int(os.environ.get('COMPARE_MAX_CONCURRENCY', '4'))
+COMPARE_CHAIN_TIMEOUT = float(os.environ.get('COMPARE_CHAIN_TIMEOUT', '30'))
+
+# Datasets under data/ are evicted once their total size passes the budget.
+# 'lru' evicts the least recently used first, 'lfu' the least requested.
+# Datasets that are locked, being fetched or were touched within
+# DATA_CACHE_MIN_IDLE_SECONDS are never evicted.
+DATA_CACHE_MAX_BYTES = int(
+    os.environ.get('DATA_CACHE_MAX_MB', '51200')) * 1024 * 1024
+DATA_CACHE_EVICTION_POLICY = os.environ.get(
+    'DATA_CACHE_EVICTION_POLICY', 'lru')
+DATA_CACHE_SWEEP_SECONDS = float(
+    os.environ.get('DATA_CACHE_SWEEP_SECONDS', '300'))
+DATA_CACHE_MIN_IDLE_SECONDS = float(
+    os.environ.get('DATA_CACHE_MIN_IDLE_SECONDS', '900'))
+DATA_CACHE_INDEX_PATH = 'data/cache_index.json'
+# Each worker merges its recorded accesses into the shared index this often
+DATA_CACHE_FLUSH_SECONDS = float(
+    os.environ.get('DATA_CACHE_FLUSH_SECONDS', '10'))
+
+DATA_CACHE_INDEX = {}
+# Accesses recorded since the last merge into the shared index
+DATA_CACHE_ACCESSES = {}
+DATA_CACHE_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+_data_cache_sweep = None
+
+# The most requested datasets (accessed within WARM_CACHE_WINDOW_SECONDS,
+# ranked by access count) are refreshed in the background on a per-chain
+# cadence, e.g. WARM_CACHE_INTERVALS="eth=12,base=4". Requests are answered
+# from the last synced state while it is younger than
+# WARM_CACHE_MAX_STALENESS_SECONDS unless they ask for strict freshness.
+WARM_CACHE_SIZE = int(os.environ.get('WARM_CACHE_SIZE', '50'))
+WARM_CACHE_WINDOW_SECONDS = float(
+    os.environ.get('WARM_CACHE_WINDOW_SECONDS', '3600'))
+WARM_CACHE_DEFAULT_INTERVAL = float(
+    os.environ.get('WARM_CACHE_DEFAULT_INTERVAL', '30'))
+WARM_CACHE_INTERVALS = {
+    network: float(interval)
+    for network, interval in (
+        item.split('=') for item in os.environ.get('WARM_CACHE_INTERVALS', '').split(',') if item)
+}
+WARM_CACHE_CONCURRENCY = int(os.environ.get('WARM_CACHE_CONCURRENCY', '4'))
+WARM_CACHE_TICK_SECONDS = float(
+    os.environ.get('WARM_CACHE_TICK_SECONDS', '1'))
+WARM_CACHE_MAX_STALENESS_SECONDS = float(
+    os.environ.get('WARM_CACHE_MAX_STALENESS_SECONDS', '120'))
+
+# Queued analysis jobs (/api/jobs). A bounded pool of workers drains a
+# priority queue where requests answerable from cached data go first; cold
+# fetches are capped per chain and refused outright under memory pressure.
+# Cold jobs for a chain at its cap are set aside rather than waited on, so
+# workers stay free for jobs the cache can answer.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_QUEUE_MAX = int(os.environ.get('JOB_QUEUE_MAX', '100'))
+JOB_MAX_COLD_PER_CHAIN = int(os.environ.get('JOB_MAX_COLD_PER_CHAIN', '2'))
+JOB_RESULT_TTL_SECONDS = float(
+    os.environ.get('JOB_RESULT_TTL_SECONDS', '3600'))
+JOB_RETRY_AFTER_SECONDS = int(os.environ.get('JOB_RETRY_AFTER_SECONDS', '5'))
+# Memory admission: 0 disables the RSS ceiling
+JOB_MAX_RSS_MB = float(os.environ.get('JOB_MAX_RSS_MB', '0'))
+JOB_MIN_AVAILABLE_MB = float(os.environ.get('JOB_MIN_AVAILABLE_MB', '512'))
+JOB_PRIORITY_CACHED = 0
+JOB_PRIORITY_COLD = 1
+JOBS = {}
+# Job statuses are published here so any worker can answer a status poll
+JOB_STATUS_DIR = 'data/_jobs'
+COLD_FETCHES = {}
+DEFERRED_COLD_JOBS = {}
+_job_queue = None
+_job_sequence = 0
+
+# Per-stage timings, row and byte counters and cache results, served in the
+# Prometheus text format at /metrics and per request as a Server-Timing
+# header. Disabled with METRICS_ENABLED=0, which makes recording a no-op.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRIC_DEFINITIONS = {
+    'chaindensity_stage_seconds': (
+        'histogram', 'Time spent in each processing stage',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)),
+    'chaindensity_request_seconds': (
+        'histogram', 'Request latency by endpoint',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)),
+    'chaindensity_request_peak_rss_bytes': (
+        'histogram', 'Peak resident memory of the server process during a request',
+        tuple(2 ** power * 1024 * 1024 for power in range(6, 15))),
+    'chaindensity_rows_processed_total': (
+        'counter', 'Rows processed by stage', None),
+    'chaindensity_bytes_written_total': (
+        'counter', 'Bytes written to dataset segments', None),
+    'chaindensity_cache_requests_total': (
+        'counter', 'Cache lookups by cache and result', None),
+}
+METRICS = {}
+# Stage durations of the current request, reported as Server-Timing
+REQUEST_TIMINGS = ContextVar('request_timings', default=None)
+# Set inside pool workers: metrics are buffered and replayed by the caller
+METRICS_BUFFER = ContextVar('metrics_buffer', default=None)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+BACKGROUND_TASKS = set()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,9 +330,10 @@ async def fetch_chain_data():
     # Use HTTPS for the default domain, HTTP for custom domain
     protocol = 'https' if hyperquery_chains_domain == 'chains.hyperquery.xyz' else 'http'
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f'{protocol}://{hyperquery_chains_domain}/active_chains?ecosystem=evm') as response:
-            data = await response.json()
+    session = get_http_session()
+    async with session.get(f'{protocol}://{hyperquery_chains_domain}/active_chains?ecosystem=evm') as response:
+        response.raise_for_status()
+        data = await response.json()
 
     # Get the base domain for Hypersync from environment variable, with a default value
     hypersync_domain = os.environ.get('HYPERSYNC_DOMAIN', 'hypersync.xyz')
@@ -54,16 +348,509 @@ async def fetch_chain_data():
     return chain_data
 
 
+def get_http_session():
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        # Only needed once the chain registry is fetched
+        import aiohttp
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS))
+    return _http_session
+
+
+def get_hypersync_client(network_url):
+    # One long-lived client per network so connections are reused across requests
+    client = HYPERSYNC_CLIENTS.get(network_url)
+    if client is None:
+        client = hypersync.HypersyncClient(
+            hypersync.ClientConfig(url=network_url))
+        HYPERSYNC_CLIENTS[network_url] = client
+    return client
+
+
+def clear_chain_data_refresh(_):
+    global _chain_data_refresh
+    _chain_data_refresh = None
+
+
+async def refresh_chain_data():
+    global CHAIN_DATA, _chain_data_refresh
+    # Concurrent callers share one registry request
+    if _chain_data_refresh is None:
+        _chain_data_refresh = asyncio.ensure_future(fetch_chain_data())
+        _chain_data_refresh.add_done_callback(clear_chain_data_refresh)
+    chain_data = await asyncio.shield(_chain_data_refresh)
+
+    # Drop pooled clients for chains that are no longer served
+    active_urls = {chain['url'] for chain in chain_data.values()}
+    for url in list(HYPERSYNC_CLIENTS):
+        if url not in active_urls:
+            del HYPERSYNC_CLIENTS[url]
+    CHAIN_DATA = chain_data
+    await asyncio.to_thread(publish_json, CHAIN_REGISTRY_PATH,
+                            {'fetched_at': time.time(), 'chains': chain_data})
+    return CHAIN_DATA
+
+
+def read_chain_registry():
+    try:
+        with open(CHAIN_REGISTRY_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+async def refresh_chain_data_logged():
+    try:
+        await refresh_chain_data()
+        logger.info(f"Refreshed chain registry: {len(CHAIN_DATA)} chains")
+    except Exception as e:
+        # Keep serving the last known registry
+        logger.error(
+            f"Error refreshing chain registry: {str(e)}", exc_info=True)
+
+
+async def ensure_chain_data():
+    if not CHAIN_DATA:
+        await refresh_chain_data()
+    return CHAIN_DATA
+
+
+async def chain_registry_refresher():
+    while True:
+        await asyncio.sleep(CHAIN_REGISTRY_TTL_SECONDS)
+        await refresh_chain_data_logged()
+
+
+# Transient conditions the handlers answer with 503
+class ServiceUnavailableError(Exception):
+    pass
+
+
+class ProcessPoolBusyError(ServiceUnavailableError):
+    pass
+
+
+class ProcessPoolTimeoutError(ProcessPoolBusyError):
+    pass
+
+
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None and PROCESS_POOL_WORKERS > 0:
+        # Spawn rather than fork: polars and hypersync hold threads that don't
+        # survive a fork
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'))
+    return _process_pool
+
+
+async def run_in_process(func, *args, timeout=PROCESS_POOL_TASK_TIMEOUT):
+    global _process_pool_slots
+    if _process_pool_slots is None:
+        _process_pool_slots = asyncio.Semaphore(
+            max(PROCESS_POOL_WORKERS, 1) + PROCESS_POOL_MAX_QUEUE)
+    if _process_pool_slots.locked():
+        raise ProcessPoolBusyError(
+            "Too many tasks queued for processing, try again later.")
+
+    await _process_pool_slots.acquire()
+    try:
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        if METRICS_ENABLED:
+            args = (func, *args)
+            func = call_with_metrics
+        if pool is None:
+            future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        else:
+            future = loop.run_in_executor(pool, func, *args)
+    except BaseException:
+        _process_pool_slots.release()
+        raise
+    # The slot is held until the work itself finishes, not just until the
+    # caller gives up, so timed out tasks still count against the queue bound
+    def release(future):
+        _process_pool_slots.release()
+        # Nobody may be awaiting a timed out task; collect its outcome here
+        if not future.cancelled():
+            future.exception()
+    future.add_done_callback(release)
+
+    try:
+        result = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise ProcessPoolTimeoutError(
+            "Processing took too long, try again later.")
+    if METRICS_ENABLED:
+        result, events = result
+        replay_metrics(events)
+    return result
+
+
+def metric_labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    _, _, buckets = METRIC_DEFINITIONS[name]
+    series = METRICS.get((name, metric_labels(labels)))
+    if series is None:
+        series = METRICS[(name, metric_labels(labels))] = {
+            'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            series['buckets'][i] += 1
+    series['sum'] += value
+    series['count'] += 1
+
+
+def increment(name, value=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    buffer = METRICS_BUFFER.get()
+    if buffer is not None:
+        buffer.append(('increment', name, value, labels))
+        return
+    key = (name, metric_labels(labels))
+    METRICS[key] = METRICS.get(key, 0) + value
+
+
+def record_stage(stage, seconds):
+    if not METRICS_ENABLED:
+        return
+    buffer = METRICS_BUFFER.get()
+    if buffer is not None:
+        buffer.append(('stage', stage, seconds, {}))
+        return
+    timings = REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+        timings['_rss'] = max(timings.get('_rss', 0),
+                              psutil.Process(os.getpid()).memory_info().rss)
+    observe('chaindensity_stage_seconds', seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def call_with_metrics(func, *args):
+    events = []
+    token = METRICS_BUFFER.set(events)
+    try:
+        return func(*args), events
+    finally:
+        METRICS_BUFFER.reset(token)
+
+
+def replay_metrics(events):
+    for kind, name, value, labels in events:
+        if kind == 'stage':
+            record_stage(name, value)
+        else:
+            increment(name, value, **labels)
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def render_metrics():
+    lines = []
+    for name, (kind, help_text, buckets) in METRIC_DEFINITIONS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (series_name, labels), value in sorted(METRICS.items()):
+            if series_name != name:
+                continue
+            if kind == 'counter':
+                lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+            for bound, count in zip(buckets, value['buckets']):
+                lines.append(
+                    f"{name}_bucket{format_labels(labels, le=bound)} {count}")
+            lines.append(
+                f"{name}_bucket{format_labels(labels, le='+Inf')} {value['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+
+    gauges = [
+        ('chaindensity_process_rss_bytes', 'Resident memory of the server process',
+         psutil.Process(os.getpid()).memory_info().rss),
+        ('chaindensity_inflight_fetches', 'Upstream fetches in progress',
+         len(INFLIGHT_FETCHES)),
+        ('chaindensity_queued_jobs', 'Jobs waiting for a worker',
+         queued_jobs()),
+        ('chaindensity_data_cache_bytes', 'Size of cached datasets on disk',
+         sum(entry['size'] for entry in DATA_CACHE_INDEX.values())),
+    ]
+    for name, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}",
+                  f"# TYPE {name} gauge", f"{name} {value}"]
+    return '\n'.join(lines) + '\n'
+
+
+class RenderCache:
+    def __init__(self, memory_budget, disk_budget, disk_dir):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.disk_dir = disk_dir
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+
+    # The memory tier is only touched on the event loop; disk reads, writes
+    # and eviction scans run in a thread so multi-MB entries don't block it
+    async def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        value = await asyncio.to_thread(self._read_disk, key)
+        if value is not None:
+            self._put_memory(key, value)
+        return value
+
+    async def put(self, key, value):
+        self._put_memory(key, value)
+        if self.disk_budget <= 0 or len(value) > self.disk_budget:
+            return
+        await asyncio.to_thread(self._write_disk, key, value)
+
+    def _read_disk(self, key):
+        path = f"{self.disk_dir}/{key}"
+        try:
+            with open(path) as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        # Touch so disk eviction sees it as recently used
+        os.utime(path)
+        return value
+
+    def _write_disk(self, key, value):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                f.write(value)
+        publish_file(f"{self.disk_dir}/{key}", write)
+        self._evict_disk()
+
+    def _put_memory(self, key, value):
+        if len(value) > self.memory_budget:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = value
+        self.memory_bytes += len(value)
+        while self.memory_bytes > self.memory_budget:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if not entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_budget:
+                break
+            # Another worker may be evicting the same entry
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+RENDER_CACHE = RenderCache(RENDER_CACHE_MEMORY_BYTES,
+                           RENDER_CACHE_DISK_BYTES, RENDER_CACHE_DIR)
+
+
+def dataset_etag(directory, manifest, *options):
+    interval_size = interval_size_for(
+        manifest['min_block'], manifest['max_block'])
+    key = json.dumps([directory, dataset_version(manifest),
+                     interval_size, *options])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+async def cached_create_plot(directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached, manifest,
+                             bucket='block', selected_network=None, network_url=None):
+    render_key = dataset_etag(directory, manifest, request_type, bucket, RENDER_OPTIONS)
+    img = await RENDER_CACHE.get(render_key)
+    increment('chaindensity_cache_requests_total', cache='render',
+              result='miss' if img is None else 'hit')
+    if img is None:
+        if bucket != 'block':
+            await ensure_timestamp_index(selected_network, network_url, manifest['max_block'])
+        img, stats = await run_in_process(
+            create_plot, directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached,
+            bucket, selected_network)
+        await RENDER_CACHE.put(render_key, img)
+    else:
+        logger.info(f"Render cache hit for {directory}")
+        stats = build_stats(request_type, total_blocks, total_items, elapsed_time,
+                            start_block, is_cached, manifest['max_block'])
+    return img, stats
+
+
+async def conditional_response(body, etag, manifest):
+    # Weak validator: the rendered data is identical, but per-request stats
+    # such as elapsed_time may differ
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = await make_response(body)
+    response.set_etag(etag, weak=True)
+    response.last_modified = datetime.fromtimestamp(
+        manifest['modified_at'], tz=timezone.utc)
+    return response
+
+
 app = Quart(__name__)
 allowed_origins = os.environ.get('ALLOWED_ORIGINS', '*')
 app = cors(app, allow_origin=allowed_origins)
 
 
+@app.before_serving
+async def start_data_cache_manager():
+    global _data_cache_sweep
+    load_data_cache_index()
+    _data_cache_sweep = asyncio.Event()
+    run_in_background(data_cache_sweeper())
+
+
+@app.before_serving
+async def start_warm_cache_scheduler():
+    if WARM_CACHE_SIZE > 0:
+        run_in_background(warm_cache_scheduler())
+
+
+@app.before_serving
+async def start_job_workers():
+    global _job_queue
+    _job_queue = asyncio.PriorityQueue()
+    for _ in range(JOB_WORKERS):
+        run_in_background(job_worker())
+
+
+@app.before_serving
+async def load_chain_registry():
+    global CHAIN_DATA
+    # Start from the copy saved by another worker or an earlier run, so a new
+    # worker serves without waiting on the registry service
+    saved = read_chain_registry()
+    if saved and saved['chains']:
+        CHAIN_DATA = saved['chains']
+        logger.info(f"Loaded saved chain registry: {len(CHAIN_DATA)} chains")
+        if time.time() - saved['fetched_at'] > CHAIN_REGISTRY_TTL_SECONDS:
+            run_in_background(refresh_chain_data_logged())
+    else:
+        try:
+            await refresh_chain_data()
+            logger.info(f"Loaded chain registry: {len(CHAIN_DATA)} chains")
+        except Exception as e:
+            # Requests retry the load until the registry becomes reachable
+            logger.error(f"Error loading chain registry: {str(e)}", exc_info=True)
+    run_in_background(chain_registry_refresher())
+
+
+@app.before_serving
+async def mark_ready():
+    # Registered last, so every other startup hook has finished
+    global _ready
+    _ready = True
+
+
+@app.after_serving
+async def mark_not_ready():
+    global _ready
+    _ready = False
+
+
+@app.after_serving
+async def stop_data_cache_manager():
+    for task in list(BACKGROUND_TASKS):
+        task.cancel()
+    merge_data_cache_index(take_data_cache_accesses())
+
+
+@app.after_serving
+async def close_connection_pools():
+    global _http_session
+    HYPERSYNC_CLIENTS.clear()
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+
+@app.after_serving
+async def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+@app.before_request
+async def start_request_timing():
+    if METRICS_ENABLED:
+        REQUEST_TIMINGS.set({'_start': time.perf_counter()})
+
+
+@app.after_request
+async def add_server_timing(response):
+    timings = REQUEST_TIMINGS.get()
+    if timings is None:
+        return response
+    elapsed = time.perf_counter() - timings.pop('_start')
+    rss = max(timings.pop('_rss', 0),
+              psutil.Process(os.getpid()).memory_info().rss)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe('chaindensity_request_seconds', elapsed, endpoint=endpoint)
+    observe('chaindensity_request_peak_rss_bytes', rss, endpoint=endpoint)
+    response.headers['Server-Timing'] = ', '.join(
+        [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()] +
+        [f"total;dur={elapsed * 1000:.1f}"])
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    if not METRICS_ENABLED:
+        return {"error": "Metrics are disabled"}, 404
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4')
+
+
+@app.route('/ready', methods=['GET'])
+async def ready():
+    # Readiness probe: startup is done and the chain registry is loaded, so
+    # requests can be served without waiting on anything upstream
+    if not _ready or not CHAIN_DATA:
+        return {"ready": False, "worker": os.getpid()}, 503
+    return {"ready": True, "worker": os.getpid(), "chains": len(CHAIN_DATA)}
+
+
 @app.route('/', methods=['GET', 'POST'])
 async def index():
-    global CHAIN_DATA
-    if not CHAIN_DATA:
-        CHAIN_DATA = await fetch_chain_data()
+    await ensure_chain_data()
 
     if request.method == 'POST':
         form_data = await request.form
@@ -76,9 +863,17 @@ async def index():
             directory, total_blocks, total_items, elapsed_time, start_block, is_cached = await fetch_data(address, selected_network, network_url, request_type)
             if total_items == 0:
                 return await render_template('error.html', message=f"No {request_type}s found for {address} on the {selected_network} network.")
-            img, stats = create_plot(
-                directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached)
-            return await render_template('plot.html', plot_url=img, stats=stats)
+            manifest = load_manifest(directory)
+            etag = dataset_etag(directory, manifest,
+                                request_type, 'html', RENDER_OPTIONS)
+            if request.if_none_match.contains_weak(etag):
+                return await conditional_response('', etag, manifest)
+            img, stats = await cached_create_plot(
+                directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached, manifest)
+            return await conditional_response(
+                await render_template('plot.html', plot_url=img, stats=stats), etag, manifest)
+        except ServiceUnavailableError as e:
+            return await render_template('error.html', message=str(e)), 503
         except Exception as e:
             error_message = str(e)
             print(f"Error: {error_message}")
@@ -90,135 +885,1306 @@ async def index():
 
 @app.route('/api/networks', methods=['GET'])
 async def api_networks():
-    global CHAIN_DATA
-    if not CHAIN_DATA:
-        CHAIN_DATA = await fetch_chain_data()
+    await ensure_chain_data()
     sorted_networks = sorted(CHAIN_DATA.keys())
     return {"networks": sorted_networks}
 
 
+def request_flag(source, name):
+    # JSON bodies carry booleans, query strings '1' or 'true'
+    value = source.get(name, False)
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true')
+    return bool(value)
+
+
+def parse_analysis_params(source, formats=('png', 'json')):
+    # Type, format, strict, bucket and by_signature options shared by the
+    # analysis endpoints. Returns (params, None), or (None, a 400 response).
+    response_format = source.get('format', formats[0])
+    if response_format not in formats:
+        return None, ({"error": f"Unsupported format: {response_format}"}, 400)
+    # Bins are block intervals by default, or hours/days/weeks of chain time
+    bucket = source.get('bucket', 'block')
+    if bucket != 'block' and bucket not in TIME_BUCKETS:
+        return None, ({"error": f"Unsupported bucket: {bucket}. Use block, {', '.join(TIME_BUCKETS)}"}, 400)
+    # Event density stacked by topic0, kept as its own dataset
+    request_type = source.get('type', 'event')
+    if request_flag(source, 'by_signature') and request_type == 'event':
+        request_type = SIGNATURE_REQUEST_TYPE
+    if request_type == SIGNATURE_REQUEST_TYPE and bucket != 'block':
+        return None, ({"error": "Signature breakdowns are only available per block interval"}, 400)
+    return {
+        'type': request_type,
+        'format': response_format,
+        # Strict requests always sync with the chain head before answering
+        'strict': request_flag(source, 'strict'),
+        'bucket': bucket,
+    }, None
+
+
 @app.route('/api/data', methods=['POST'])
 async def api_data():
-    global CHAIN_DATA
-    if not CHAIN_DATA:
-        CHAIN_DATA = await fetch_chain_data()
+    await ensure_chain_data()
 
     # Get form data from request body as JSON
     json_data = await request.get_json()
     address = json_data['address'].lower()
-    request_type = json_data['type']
     selected_network = json_data['network']
     network_url = CHAIN_DATA.get(selected_network, {}).get(
         'url', "https://eth.hypersync.xyz")
+    # 'png' renders the plot, 'json' and 'arrow' return the interval bins only.
+    # Options in the body take precedence over the query string.
+    params, error = parse_analysis_params(
+        {**request.args.to_dict(), **json_data}, ('png', 'json', 'arrow'))
+    if error:
+        return error
+    request_type, response_format = params['type'], params['format']
+    strict, bucket = params['strict'], params['bucket']
+
+    if memory_pressure() and not is_dataset_cached(address, selected_network, request_type):
+        return overloaded("Server is low on memory; retry shortly")
 
     try:
-        directory, total_blocks, total_items, elapsed_time, start_block, is_cached = await fetch_data(address, selected_network, network_url, request_type)
-        if total_items == 0:
+        dataset = await fetch_result(
+            address, selected_network, network_url, request_type, strict=strict)
+        if dataset is None:
             return {"error": f"No {request_type}s found for {address} on the {selected_network} network."}, 404
 
-        # Get the plot and stats
-        img, stats = create_plot(
-            directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached)
+        manifest = dataset['manifest']
+        etag = dataset_etag(dataset['directory'], manifest, request_type,
+                            response_format, bucket, RENDER_OPTIONS)
+        if request.if_none_match.contains_weak(etag):
+            return await conditional_response('', etag, manifest)
+
+        result = await render_result(dataset, response_format, bucket=bucket)
+        if response_format == 'arrow':
+            result = Response(result, content_type='application/vnd.apache.arrow.stream')
+        return await conditional_response(result, etag, manifest)
+    except ServiceUnavailableError as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        error_message = str(e)
+        print(f"Error: {error_message}")
+        return {"error": f"An unexpected error occurred. Error: {error_message}"}, 500
+
+
+async def fetch_result(address, selected_network, network_url, request_type, strict=False, progress=None):
+    directory, total_blocks, total_items, elapsed_time, start_block, is_cached = await fetch_data(
+        address, selected_network, network_url, request_type, progress=progress, strict=strict)
+    if total_items == 0:
+        return None
+    return {
+        "directory": directory,
+        "manifest": load_manifest(directory),
+        "request_type": request_type,
+        "address": address,
+        "network": selected_network,
+        "network_url": network_url,
+        "total_blocks": total_blocks,
+        "total_items": total_items,
+        "elapsed_time": elapsed_time,
+        "start_block": start_block,
+        "is_cached": is_cached,
+    }
+
+
+# 'png' and 'json' return the result dict, 'arrow' returns the interval bins
+# as an IPC stream that carries the rest of the result as schema metadata
+async def render_result(dataset, response_format, progress=None, bucket='block'):
+    def report(stage):
+        if progress is not None:
+            progress(stage)
+
+    directory, manifest = dataset['directory'], dataset['manifest']
+    request_type, selected_network = dataset['request_type'], dataset['network']
+    totals = (dataset['total_blocks'], dataset['total_items'], dataset['elapsed_time'],
+              dataset['start_block'], dataset['is_cached'])
+    result = {
+        "request_type": request_type,
+        "address": dataset['address'],
+        "network": selected_network,
+        "total_blocks": dataset['total_blocks'],
+        "total_items": dataset['total_items'],
+        "elapsed_time": dataset['elapsed_time']
+    }
+    if response_format == 'png':
+        report('rendering')
+        img, stats = await cached_create_plot(
+            directory, request_type, *totals, manifest,
+            bucket, selected_network, dataset['network_url'])
+        result.update({"plot_url": img, "stats": stats})
+    else:
+        report('binning')
+        interval_counts, interval_size, signatures = await interval_result(
+            directory, manifest, request_type, bucket, selected_network, dataset['network_url'])
+        result.update({
+            "stats": build_stats(request_type, *totals, manifest['max_block']),
+            "bucket": bucket,
+            "interval_size": interval_size,
+        })
+        if signatures:
+            result["signatures"] = signature_summary(signatures)
+    report('analytics')
+    result["stats"]["analytics"] = await run_in_process(
+        cached_analytics, directory, manifest)
+    if response_format == 'arrow':
+        return histogram_to_ipc(interval_counts, result, signatures)
+    if response_format != 'png':
+        result["bins"] = interval_bins(interval_counts, signatures)
+    return result
+
+
+async def data_result(address, selected_network, network_url, request_type, response_format, strict=False, progress=None, bucket='block'):
+    dataset = await fetch_result(
+        address, selected_network, network_url, request_type, strict=strict, progress=progress)
+    if dataset is None:
+        return None
+    return await render_result(dataset, response_format, progress, bucket)
+
+
+@app.route('/api/data/stream', methods=['GET'])
+async def api_data_stream():
+    await ensure_chain_data()
+
+    address = request.args.get('address', '').lower()
+    selected_network = request.args.get('network', '')
+    network_url = CHAIN_DATA.get(selected_network, {}).get(
+        'url', "https://eth.hypersync.xyz")
+    params, error = parse_analysis_params(request.args)
+    if error:
+        return error
+    request_type, response_format = params['type'], params['format']
+    strict, bucket = params['strict'], params['bucket']
+
+    events = asyncio.Queue()
+
+    def progress(stage, **info):
+        events.put_nowait((stage, info))
+
+    async def run():
+        try:
+            result = await data_result(
+                address, selected_network, network_url, request_type, response_format, strict, progress, bucket)
+            if result is None:
+                progress('error', error=f"No {request_type}s found for {address} on the {selected_network} network.")
+                return
+            progress('result', **result)
+        except ServiceUnavailableError as e:
+            progress('error', error=str(e))
+        except Exception as e:
+            error_message = str(e)
+            logger.error(f"Error streaming {request_type}s for {address} on {selected_network}: {error_message}", exc_info=True)
+            progress('error', error=f"An unexpected error occurred. Error: {error_message}")
+        finally:
+            events.put_nowait(None)
+
+    async def stream():
+        task = asyncio.ensure_future(run())
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                stage, info = event
+                yield f"event: {stage}\ndata: {json.dumps(info)}\n\n".encode()
+        finally:
+            # The shared fetch itself is shielded; this only stops our render
+            task.cancel()
+
+    response = await make_response(stream(), {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.timeout = None
+    return response
+
+
+@app.route('/api/jobs', methods=['POST'])
+async def api_jobs_submit():
+    await ensure_chain_data()
+
+    json_data = await request.get_json()
+    address = json_data['address'].lower()
+    selected_network = json_data['network']
+    params, error = parse_analysis_params(json_data)
+    if error:
+        return error
+    request_type = params['type']
+
+    prune_jobs()
+    if queued_jobs() >= JOB_QUEUE_MAX:
+        return overloaded("Job queue is full; retry shortly")
+    cached = is_dataset_cached(address, selected_network, request_type)
+    if not cached and memory_pressure():
+        return overloaded("Server is low on memory; retry shortly")
+
+    job = submit_job({
+        'address': address,
+        'network': selected_network,
+        **params,
+    }, JOB_PRIORITY_CACHED if cached else JOB_PRIORITY_COLD)
+    return job_status(job), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+async def api_jobs_status(job_id):
+    job = JOBS.get(job_id)
+    if job is not None:
+        return job_status(job)
+    # Submitted to another worker
+    status = published_job_status(job_id)
+    if status is None:
+        return {"error": f"Unknown job: {job_id}"}, 404
+    return status
+
+
+@app.route('/api/batch', methods=['POST'])
+async def api_batch():
+    await ensure_chain_data()
+
+    json_data = await request.get_json()
+    addresses = list(dict.fromkeys(address.lower()
+                     for address in json_data.get('addresses', [])))
+    request_type = json_data['type']
+    selected_network = json_data['network']
+    include_bins = json_data.get('include_bins', True)
+    network_url = CHAIN_DATA.get(selected_network, {}).get(
+        'url', "https://eth.hypersync.xyz")
+    if not addresses or len(addresses) > BATCH_MAX_ADDRESSES:
+        return {"error": f"addresses must contain between 1 and {BATCH_MAX_ADDRESSES} addresses"}, 400
+
+    try:
+        datasets, elapsed_time = await fetch_batch(
+            addresses, selected_network, network_url, request_type)
+
+        found = {address: (dataset['directory'], dataset['manifest'])
+                 for address, dataset in datasets.items()
+                 if dataset['manifest'] and dataset['manifest']['segments']}
+        interval_counts = {}
+        if include_bins and found:
+            interval_counts = await run_in_process(batch_interval_counts, found)
+
+        results = {}
+        for address in addresses:
+            if address not in found:
+                results[address] = {
+                    "error": f"No {request_type}s found for {address} on the {selected_network} network."}
+                continue
+            manifest = found[address][1]
+            total_blocks, total_items = manifest_stats(manifest)
+            results[address] = {
+                "total_blocks": total_blocks,
+                "total_items": total_items,
+                "is_cached": datasets[address]['is_cached'],
+            }
+            if address in interval_counts:
+                counts, interval_size = interval_counts[address]
+                results[address]["interval_size"] = interval_size
+                results[address]["bins"] = interval_bins(counts)
 
-        # Return JSON response with base64 encoded image
         return {
-            "plot_url": img,
-            "stats": stats,
             "request_type": request_type,
-            "address": address,
             "network": selected_network,
+            "elapsed_time": elapsed_time,
+            "results": results
+        }
+    except ServiceUnavailableError as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        error_message = str(e)
+        logger.error(f"Error in batch request on {selected_network}: {error_message}", exc_info=True)
+        return {"error": f"An unexpected error occurred. Error: {error_message}"}, 500
+
+
+async def compare_chain(address, selected_network, request_type, semaphore, timeout, bucket='block'):
+    if selected_network not in CHAIN_DATA:
+        return selected_network, {"error": f"Unknown network: {selected_network}"}
+    network_url = CHAIN_DATA[selected_network]['url']
+
+    async def collect():
+        async with semaphore:
+            return await collect_counts()
+
+    async def collect_counts():
+        directory, total_blocks, total_items, elapsed_time, start_block, is_cached = await fetch_data(
+            address, selected_network, network_url, request_type)
+        if total_items == 0:
+            return {"error": f"No {request_type}s found for {address} on the {selected_network} network."}
+
+        manifest = load_manifest(directory)
+        interval_counts, interval_size, signatures = await interval_result(
+            directory, manifest, request_type, bucket, selected_network, network_url)
+        result = {
             "total_blocks": total_blocks,
             "total_items": total_items,
-            "elapsed_time": elapsed_time
+            "elapsed_time": elapsed_time,
+            "is_cached": is_cached,
+            "interval_size": interval_size,
+            "bins": interval_bins(interval_counts, signatures),
         }
+        if signatures:
+            result["signatures"] = signature_summary(signatures)
+        return result
+
+    def retrieve(task):
+        # Nobody may be awaiting a timed out chain; collect its outcome here
+        if not task.cancelled():
+            task.exception()
+
+    try:
+        # Each chain runs in the background and holds its slot until its work
+        # finishes, so timed out chains still count against the concurrency.
+        # The timeout covers waiting for a slot and only stops us waiting.
+        task = run_in_background(collect())
+        task.add_done_callback(retrieve)
+        return selected_network, await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        return selected_network, {"pending": True, "error": f"Timed out after {timeout}s, the fetch continues in the background."}
+    except ServiceUnavailableError as e:
+        return selected_network, {"error": str(e)}
     except Exception as e:
         error_message = str(e)
-        print(f"Error: {error_message}")
+        logger.error(f"Error comparing {address} on {selected_network}: {error_message}", exc_info=True)
+        return selected_network, {"error": f"An unexpected error occurred. Error: {error_message}"}
+
+
+@app.route('/api/compare', methods=['POST'])
+async def api_compare():
+    await ensure_chain_data()
+
+    json_data = await request.get_json()
+    address = json_data['address'].lower()
+    networks = list(dict.fromkeys(json_data.get('networks', [])))
+    concurrency = min(int(json_data.get(
+        'concurrency', COMPARE_MAX_CONCURRENCY)), COMPARE_MAX_CONCURRENCY)
+    timeout = min(float(json_data.get('timeout', COMPARE_CHAIN_TIMEOUT)),
+                  COMPARE_CHAIN_TIMEOUT)
+    if not networks or len(networks) > COMPARE_MAX_NETWORKS:
+        return {"error": f"networks must contain between 1 and {COMPARE_MAX_NETWORKS} networks"}, 400
+    if concurrency < 1 or timeout <= 0:
+        return {"error": "concurrency and timeout must be positive"}, 400
+    # Time buckets line the chains up on a common axis despite different
+    # block times. Results are always JSON, so no format is accepted.
+    params, error = parse_analysis_params(
+        {key: value for key, value in json_data.items() if key != 'format'})
+    if error:
+        return error
+    request_type, bucket = params['type'], params['bucket']
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.ensure_future(compare_chain(address, network, request_type, semaphore, timeout, bucket))
+             for network in networks]
+
+    if not json_data.get('stream', False):
+        results = dict(await asyncio.gather(*tasks))
+        return {"address": address, "request_type": request_type, "bucket": bucket, "results": results}
+
+    async def stream():
+        # Warm chains finish first, so clients can draw them straight away
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                network, result = await next_result
+                yield f"event: chain\ndata: {json.dumps({'network': network, **result})}\n\n".encode()
+            yield b"event: done\ndata: {}\n\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    response = await make_response(stream(), {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.timeout = None
+    return response
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+async def api_cache_stats():
+    total_bytes = sum(entry['size'] for entry in DATA_CACHE_INDEX.values())
+    hottest = sorted(DATA_CACHE_INDEX.items(),
+                     key=lambda item: item[1]['hits'], reverse=True)[:10]
+    return {
+        "total_bytes": total_bytes,
+        "budget_bytes": DATA_CACHE_MAX_BYTES,
+        "policy": DATA_CACHE_EVICTION_POLICY,
+        "datasets": len(DATA_CACHE_INDEX),
+        **DATA_CACHE_STATS,
+        "hottest": [{"dataset": name, **entry} for name, entry in hottest],
+        "render_cache": {
+            "memory_bytes": RENDER_CACHE.memory_bytes,
+            "memory_entries": len(RENDER_CACHE.memory),
+        },
+    }
+
+
+@app.route('/api/plot', methods=['GET'])
+async def api_plot():
+    await ensure_chain_data()
+
+    address = request.args.get('address', '').lower()
+    selected_network = request.args.get('network', '')
+    network_url = CHAIN_DATA.get(selected_network, {}).get(
+        'url', "https://eth.hypersync.xyz")
+    params, error = parse_analysis_params(
+        request.args, tuple(FAST_RENDER_FORMATS))
+    if error:
+        return error
+    request_type, image_format = params['type'], params['format']
+    strict, bucket = params['strict'], params['bucket']
+    preset = request.args.get('size', 'medium')
+    if preset not in FAST_RENDER_PRESETS:
+        return {"error": f"Unsupported size: {preset}. Use one of {', '.join(FAST_RENDER_PRESETS)}"}, 400
+
+    if memory_pressure() and not is_dataset_cached(address, selected_network, request_type):
+        return overloaded("Server is low on memory; retry shortly")
+
+    try:
+        directory, total_blocks, total_items, elapsed_time, start_block, is_cached = await fetch_data(address, selected_network, network_url, request_type, strict=strict)
+        if total_items == 0:
+            return {"error": f"No {request_type}s found for {address} on the {selected_network} network."}, 404
+
+        manifest = load_manifest(directory)
+        etag = dataset_etag(directory, manifest, request_type, 'fast',
+                            image_format, preset, bucket, FAST_RENDER_VERSION)
+        if request.if_none_match.contains_weak(etag):
+            return await conditional_response('', etag, manifest)
+
+        if bucket != 'block':
+            await ensure_timestamp_index(selected_network, network_url, manifest['max_block'])
+        body = await run_in_process(
+            render_fast_plot, directory, manifest, request_type, image_format, preset, bucket, selected_network)
+        return await conditional_response(
+            Response(body, content_type=FAST_RENDER_FORMATS[image_format]), etag, manifest)
+    except ServiceUnavailableError as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        error_message = str(e)
+        logger.error(f"Error plotting {request_type}s for {address} on {selected_network}: {error_message}", exc_info=True)
         return {"error": f"An unexpected error occurred. Error: {error_message}"}, 500
 
 
-def create_query(address, start_block, request_type):
-    if request_type == "event":
+@app.route('/api/density', methods=['GET'])
+async def api_density():
+    address = request.args.get('address', '').lower()
+    request_type = request.args.get('type', 'event')
+    selected_network = request.args.get('network', '')
+    directory = dataset_directory(address, selected_network, request_type)
+
+    manifest = load_manifest(directory)
+    if not manifest or not manifest['segments']:
+        return {"error": f"No cached {request_type}s for {address} on the {selected_network} network. Request /api/data first."}, 404
+    record_dataset_access(dataset_key(
+        address, selected_network, request_type), True)
+
+    try:
+        # Parsed by hand: type=int would silently drop a malformed bound and
+        # widen the window to the whole dataset
+        try:
+            from_block, to_block, bins = [
+                int(request.args[name]) if name in request.args else default
+                for name, default in (('from_block', None), ('to_block', None), ('bins', 100))]
+        except ValueError:
+            return {"error": "from_block, to_block and bins must be integers"}, 400
+        if bins < 1 or bins > DENSITY_MAX_BINS:
+            return {"error": f"bins must be between 1 and {DENSITY_MAX_BINS}"}, 400
+        # Validate the effective window, with omitted bounds taken from the dataset
+        from_block = manifest['min_block'] if from_block is None else from_block
+        to_block = manifest['max_block'] + 1 if to_block is None else to_block
+        if to_block <= from_block:
+            return {"error": "to_block must be greater than from_block"}, 400
+        if from_block > manifest['max_block'] or to_block <= manifest['min_block']:
+            return {"error": f"Window {from_block}-{to_block} does not overlap the dataset (blocks {manifest['min_block']}-{manifest['max_block']})"}, 400
+
+        density = await run_in_process(
+            density_bins, directory, from_block, to_block, bins)
+        return {
+            "address": address,
+            "network": selected_network,
+            "request_type": request_type,
+            **density
+        }
+    except ServiceUnavailableError as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        error_message = str(e)
+        logger.error(f"Error computing density for {address} on {selected_network}: {error_message}", exc_info=True)
+        return {"error": f"An unexpected error occurred. Error: {error_message}"}, 500
+
+
+def is_event_type(request_type):
+    return request_type in ("event", SIGNATURE_REQUEST_TYPE)
+
+
+def default_storage_format(request_type):
+    # Compact storage drops everything but block numbers
+    return 'rows' if request_type == SIGNATURE_REQUEST_TYPE else DENSITY_STORAGE_FORMAT
+
+
+def create_query(address, start_block, request_type, select_address=False):
+    # Accepts one address or a list; select_address adds the address columns
+    # needed to split a multi-address result
+    addresses = [address] if isinstance(address, str) else list(address)
+    if is_event_type(request_type):
         query = hypersync.Query(
             from_block=start_block,
             logs=[LogSelection(
-                address=[address],
+                address=addresses,
             )],
             field_selection=FieldSelection(
                 log=[
                     LogField.BLOCK_NUMBER,
-                ],
+                ] + ([LogField.TOPIC0] if request_type == SIGNATURE_REQUEST_TYPE else [])
+                + ([LogField.ADDRESS] if select_address else []),
             ),
         )
     else:
         query = hypersync.Query(
             from_block=start_block,
             transactions=[
-                TransactionSelection(from_=[address]),
-                TransactionSelection(to=[address]),
+                TransactionSelection(from_=addresses),
+                TransactionSelection(to=addresses),
             ],
             field_selection=FieldSelection(
                 transaction=[
                     TransactionField.BLOCK_NUMBER,
-                ],
+                ] + ([TransactionField.FROM, TransactionField.TO] if select_address else []),
             ),
         )
     return query
 
 
-def process_and_write_in_chunks(input_path, output_path, chunk_size=5_000_000):
+def process_and_write_in_chunks(input_path, output_path, chunk_size=SORT_RUN_ROWS):
     logger.info(f"Processing {input_path} in chunks of {chunk_size}")
     parquet_file = pl.scan_parquet(input_path)
     total_rows = parquet_file.select(pl.len()).collect().item()
+    if total_rows == 0:
+        return
+
+    if total_rows <= chunk_size:
+        parquet_file.sort("block_number").collect().write_parquet(output_path)
+        return
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output_path) or None) as run_dir:
+        run_paths = []
+        for i in range(0, total_rows, chunk_size):
+            chunk = parquet_file.slice(i, chunk_size).collect()
+            logger.info(f"Sorting rows {i} to {i + len(chunk)}")
+            run_path = f"{run_dir}/run_{len(run_paths):04d}.parquet"
+            chunk.sort("block_number").write_parquet(run_path)
+            run_paths.append(run_path)
+            del chunk
+
+        merge_sorted_runs(run_paths, output_path)
+        logger.info(f"Merged {len(run_paths)} sorted runs into {output_path}")
+
+
+def merge_sorted_runs(run_paths, output_path, batch_rows=SORT_MERGE_BATCH_ROWS):
+    readers = [pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+               for path in run_paths]
+    buffers = [None] * len(readers)
+
+    def refill(i):
+        buffers[i] = None
+        for batch in readers[i]:
+            if batch.num_rows:
+                buffers[i] = pl.from_arrow(batch)
+                return
+
+    for i in range(len(readers)):
+        refill(i)
+
+    writer = None
+    while True:
+        active = [i for i, buffer in enumerate(buffers) if buffer is not None]
+        if not active:
+            break
+        # Every row up to the smallest buffered tail is final: no run can
+        # still produce a lower block number
+        bound = min(buffers[i]['block_number'][-1] for i in active)
+        parts = []
+        for i in active:
+            split = buffers[i]['block_number'].search_sorted(bound, side='right')
+            parts.append(buffers[i][:split])
+            buffers[i] = buffers[i][split:]
+            if buffers[i].is_empty():
+                refill(i)
+
+        table = pl.concat(parts).sort('block_number').to_arrow()
+        if writer is None:
+            writer = pq.ParquetWriter(output_path, table.schema)
+        writer.write_table(table)
+
+    if writer is not None:
+        writer.close()
 
-    schema = None
-    for i in range(0, total_rows, chunk_size):
-        chunk = parquet_file.slice(i, chunk_size).collect()
-        logger.info(f"Processing rows {i} to {i + len(chunk)}")
-        chunk_sorted = chunk.sort("block_number")
 
-        if schema is None:
-            schema = pa.Schema.from_pandas(chunk_sorted.to_pandas())
-            writer = pq.ParquetWriter(output_path, schema)
+def segments_dir(directory):
+    return f"{directory}/segments"
 
-        table = pa.Table.from_pandas(chunk_sorted.to_pandas(), schema=schema)
-        writer.write_table(table)
 
-        logger.info(f"Written sorted chunk {
-                    i // chunk_size + 1} to {output_path}")
+def manifest_path(directory):
+    return f"{directory}/manifest.json"
+
+
+def compact_block_counts(input_path, output_path):
+    logger.info(f"Writing compact block counts for {input_path}")
+    counts = pl.scan_parquet(input_path).group_by('block_number').agg(
+        pl.len().cast(pl.UInt32).alias('count')).sort('block_number').collect()
+    pq.write_table(counts.to_arrow(), output_path,
+                   **segment_write_options('compact'))
+
+
+def segment_write_options(storage_format):
+    if storage_format == 'compact':
+        # Sorted block numbers delta-encode to a few bits each; counts are
+        # mostly small repeated values that dictionary/RLE handles well
+        return {
+            'use_dictionary': ['count'],
+            'column_encoding': {'block_number': 'DELTA_BINARY_PACKED'},
+        }
+    return {}
+
+
+def load_manifest(directory):
+    try:
+        with open(manifest_path(directory)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('schema_version', 0) < MANIFEST_SCHEMA_VERSION:
+        manifest.setdefault('last_synced_head', None)
+        manifest.setdefault('synced_at', None)
+        manifest.setdefault('storage_format', 'rows')
+        manifest.setdefault('pyramid_max_block', None)
+        manifest.setdefault('modified_at', manifest['synced_at'] or time.time())
+        manifest['schema_version'] = MANIFEST_SCHEMA_VERSION
+        summarize_manifest(manifest)
+    return manifest
+
+
+def write_manifest(directory, manifest):
+    # Write to a temp file and rename so readers always see a complete manifest
+    publish_json(manifest_path(directory), manifest)
+
+
+def new_manifest(file_suffix, storage_format='rows'):
+    return {
+        'schema_version': MANIFEST_SCHEMA_VERSION,
+        'file_suffix': file_suffix,
+        'storage_format': storage_format,
+        'next_segment_id': 1,
+        'segments': [],
+        'retired': [],
+        'min_block': None,
+        'max_block': None,
+        'row_count': 0,
+        'last_synced_head': None,
+        'synced_at': None,
+        'modified_at': None,
+        'pyramid_max_block': None,
+    }
+
+
+def summarize_manifest(manifest):
+    # Dataset-wide totals are kept alongside the segment list so cached
+    # requests can answer without scanning any rows
+    segments = manifest['segments']
+    manifest['min_block'] = segments[0]['min_block'] if segments else None
+    manifest['max_block'] = segments[-1]['max_block'] if segments else None
+    manifest['row_count'] = sum(segment['rows'] for segment in segments)
+
 
-    if schema is not None:
+def manifest_stats(manifest):
+    total_blocks = manifest['max_block'] - manifest['min_block'] + 1
+    return total_blocks, manifest['row_count']
+
+
+def resume_block(manifest):
+    # Blocks up to the last synced head were already scanned, even if the
+    # address had no activity in the tail of that range
+    last_block = manifest['max_block']
+    if manifest['last_synced_head'] is not None:
+        last_block = max(last_block, manifest['last_synced_head'])
+    return int(last_block) + 1
+
+
+def dataset_version(manifest):
+    # Segments are append-only, so the block range and row count identify
+    # the data; compaction and head-only syncs don't change it
+    return f"{manifest['min_block']}-{manifest['max_block']}-{manifest['row_count']}"
+
+
+def record_sync(directory, manifest, synced_head):
+    manifest['last_synced_head'] = synced_head
+    manifest['synced_at'] = time.time()
+    write_manifest(directory, manifest)
+
+
+def segment_paths(directory, manifest):
+    return [f"{segments_dir(directory)}/{segment['file']}"
+            for segment in manifest['segments']]
+
+
+def scan_dataset(directory, manifest=None):
+    manifest = manifest or load_manifest(directory)
+    if not manifest or not manifest['segments']:
+        raise ValueError(f"No data found in {directory}")
+    # Segments cover disjoint, increasing block ranges, so the concatenation
+    # is already sorted by block_number
+    return pl.scan_parquet(segment_paths(directory, manifest))
+
+
+def scan_block_counts(paths, storage_format):
+    df = pl.scan_parquet(paths)
+    if storage_format == 'compact':
+        return df
+    return df.group_by('block_number').agg(pl.len().cast(pl.UInt32).alias('count'))
+
+
+def segment_stats(path, storage_format='rows'):
+    # 'rows' always counts logs/transactions, whatever the storage format
+    items = pl.col("count").sum() if storage_format == 'compact' else pl.len()
+    stats = pl.scan_parquet(path).select([
+        pl.col("block_number").min().alias("min_block"),
+        pl.col("block_number").max().alias("max_block"),
+        items.alias("rows")
+    ]).collect()
+    return {
+        'min_block': stats["min_block"][0],
+        'max_block': stats["max_block"][0],
+        'rows': stats["rows"][0],
+    }
+
+
+def add_segment(directory, manifest, source_path):
+    os.makedirs(segments_dir(directory), exist_ok=True)
+    segment_file = f"{manifest['file_suffix']}-{manifest['next_segment_id']:06d}.parquet"
+    increment('chaindensity_bytes_written_total', os.path.getsize(source_path))
+    os.replace(source_path, f"{segments_dir(directory)}/{segment_file}")
+    manifest['next_segment_id'] += 1
+    return segment_file
+
+
+def pyramid_path(directory, level):
+    return f"{directory}/pyramid/level_{level:02d}.parquet"
+
+
+def update_pyramid(directory, manifest, paths):
+    # Fold the block counts from `paths` into every pyramid level. The finest
+    # level is aggregated once and coarser levels are derived from it.
+    os.makedirs(f"{directory}/pyramid", exist_ok=True)
+    finest = scan_block_counts(paths, manifest['storage_format']).group_by(
+        pl.col('block_number') // (1 << PYRAMID_MIN_LEVEL)
+    ).agg(pl.col('count').cast(pl.Int64).sum()).rename(
+        {'block_number': 'bucket'}).collect()
+
+    for level in range(PYRAMID_MIN_LEVEL, PYRAMID_MAX_LEVEL + 1):
+        counts = finest.group_by(
+            pl.col('bucket') // (1 << (level - PYRAMID_MIN_LEVEL))
+        ).agg(pl.col('count').sum())
+        path = pyramid_path(directory, level)
+        if os.path.exists(path):
+            # Only the boundary bucket can overlap, but summing handles it
+            counts = pl.concat([pl.read_parquet(path), counts]).group_by(
+                'bucket').agg(pl.col('count').sum())
+        publish_file(path, counts.sort('bucket').write_parquet)
+
+    manifest['pyramid_max_block'] = manifest['max_block']
+
+
+def build_pyramid(directory):
+    manifest = load_manifest(directory)
+    shutil.rmtree(f"{directory}/pyramid", ignore_errors=True)
+    update_pyramid(directory, manifest, segment_paths(directory, manifest))
+    write_manifest(directory, manifest)
+    logger.info(f"Built density pyramid for {directory}")
+
+
+def pyramid_is_current(manifest):
+    return manifest['pyramid_max_block'] == manifest['max_block']
+
+
+def density_bins(directory, from_block, to_block, bins):
+    manifest = load_manifest(directory)
+    from_block = manifest['min_block'] if from_block is None else from_block
+    to_block = manifest['max_block'] + 1 if to_block is None else to_block
+    bin_size = -(-(to_block - from_block) // bins)
+    bins = -(-(to_block - from_block) // bin_size)
+
+    # Use a level with buckets well below the bin size so the split below
+    # stays accurate; below the finest level (or if the pyramid is behind)
+    # fall back to exact block counts
+    level = min(int(np.log2(bin_size)) - PYRAMID_OVERSAMPLE_BITS,
+                PYRAMID_MAX_LEVEL)
+    if level >= PYRAMID_MIN_LEVEL and pyramid_is_current(manifest):
+        counts = pl.scan_parquet(pyramid_path(directory, level)).filter(
+            pl.col('bucket').is_between(
+                from_block >> level, (to_block - 1) >> level)
+        ).select([
+            (pl.col('bucket') * (1 << level)).alias('block_number'),
+            pl.col('count'),
+        ])
+        resolution = 1 << level
+    else:
+        paths = [f"{segments_dir(directory)}/{segment['file']}"
+                 for segment in manifest['segments']
+                 if segment['max_block'] >= from_block and segment['min_block'] < to_block]
+        if not paths:
+            counts = pl.LazyFrame(
+                schema={'block_number': pl.Int64, 'count': pl.Int64})
+        else:
+            counts = scan_block_counts(paths, manifest['storage_format']).filter(
+                pl.col('block_number').is_between(from_block, to_block - 1))
+        resolution = 1
+    counts = counts.collect()
+
+    # A bucket is never wider than a bin, so it overlaps at most two bins.
+    # Split its count between them in proportion to the overlap, dropping
+    # the part that falls outside the window. Buckets are first trimmed to
+    # the dataset's block range since no rows exist outside it.
+    bucket_start = np.maximum(
+        counts['block_number'].to_numpy(), manifest['min_block'])
+    bucket_end = np.minimum(
+        counts['block_number'].to_numpy() + resolution, manifest['max_block'] + 1)
+    bucket_width = np.maximum(bucket_end - bucket_start, 1)
+    bucket_count = counts['count'].to_numpy().astype(np.float64)
+    lo = np.maximum(bucket_start, from_block)
+    hi = np.minimum(bucket_end, to_block)
+    first_bin = np.clip((lo - from_block) // bin_size, 0, bins - 1)
+    boundary = from_block + (first_bin + 1) * bin_size
+    in_first = np.clip(np.minimum(hi, boundary) - lo, 0, None) / bucket_width
+    in_second = np.clip(hi - boundary, 0, None) / bucket_width
+    bin_counts = (
+        np.bincount(first_bin, bucket_count * in_first, minlength=bins + 1) +
+        np.bincount(first_bin + 1, bucket_count * in_second, minlength=bins + 1)
+    )[:bins]
+
+    edges = np.minimum(from_block + np.arange(bins + 1) * bin_size, to_block)
+    return {
+        'from_block': from_block,
+        'to_block': to_block,
+        'resolution': resolution,
+        'bins': [
+            {'start': int(start), 'end': int(end), 'count': int(count)}
+            for start, end, count in zip(edges[:-1], edges[1:], largest_remainder(bin_counts))
+        ],
+    }
+
+
+def largest_remainder(values):
+    # Round to integers that still add up to the rounded total: floor every
+    # value, then give the leftover units to the largest fractional parts
+    floors = np.floor(values)
+    leftover = int(round(values.sum() - floors.sum()))
+    floors[np.argsort(floors - values, kind='stable')[:leftover]] += 1
+    return floors.astype(np.int64)
+
+
+def migrate_legacy_dataset(directory, file_suffix):
+    # Datasets written before segmented storage are a single sorted parquet
+    legacy_path = f'{directory}/{file_suffix}.parquet'
+    manifest = new_manifest(file_suffix)
+    stats = segment_stats(legacy_path)
+    segment_file = add_segment(directory, manifest, legacy_path)
+    manifest['segments'].append({'file': segment_file, **stats})
+    summarize_manifest(manifest)
+    manifest['modified_at'] = time.time()
+    write_manifest(directory, manifest)
+    logger.info(f"Migrated {legacy_path} to segment {segment_file}")
+
+
+def prepare_segment(new_file_path, sorted_file_path, storage_format):
+    with timed('sort'):
+        if storage_format == 'compact':
+            compact_block_counts(new_file_path, sorted_file_path)
+        else:
+            process_and_write_in_chunks(new_file_path, sorted_file_path)
+        stats = segment_stats(sorted_file_path, storage_format)
+    increment('chaindensity_rows_processed_total',
+              stats['rows'], stage='sort')
+    return stats
+
+
+def append_segment(directory, file_suffix, storage_format, sorted_file_path, stats, synced_head):
+    with timed('merge'):
+        manifest = load_manifest(directory) or new_manifest(
+            file_suffix, storage_format)
+        pyramid_was_current = pyramid_is_current(manifest)
+        segment_file = add_segment(directory, manifest, sorted_file_path)
+        manifest['segments'].append({'file': segment_file, **stats})
+        summarize_manifest(manifest)
+        if pyramid_was_current:
+            update_pyramid(directory, manifest, [
+                           f"{segments_dir(directory)}/{segment_file}"])
+        manifest['modified_at'] = time.time()
+        record_sync(directory, manifest, synced_head)
+    logger.info(f"Appended segment {segment_file} with {stats['rows']} rows")
+    return manifest
+
+
+def shard_ranges(start_block, end_block):
+    span = end_block - start_block
+    shards = max(1, min(FETCH_SHARDS, -(-span // FETCH_SHARD_MIN_BLOCKS)))
+    bounds = [start_block + span * i // shards for i in range(shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+async def fetch_shard(client, address, request_type, from_block, to_block, shard_directory, file_suffix, storage_format, config, semaphore, key, scanned):
+    shard_files = []
+    async with semaphore:
+        chunk_from, chunk = from_block, 0
+        while chunk_from < to_block:
+            # Listeners may join mid-fetch, so the chunk size is picked per chunk
+            step = FETCH_PROGRESS_BLOCKS if FETCH_LISTENERS.get(key) else to_block - chunk_from
+            chunk_to = min(chunk_from + step, to_block)
+            chunk_directory = f"{shard_directory}/chunk_{chunk:03d}"
+            query = create_query(address, chunk_from, request_type)
+            query.to_block = chunk_to
+            logger.info(f"Collecting blocks {chunk_from} to {
+                        chunk_to - 1} into {chunk_directory}")
+            with timed('fetch'):
+                await client.collect_parquet(chunk_directory, query, config)
+
+            chunk_file_path = f'{chunk_directory}/{file_suffix}.parquet'
+            scanned['blocks_scanned'] += chunk_to - chunk_from
+            if os.path.exists(chunk_file_path):
+                rows = pq.ParquetFile(chunk_file_path).metadata.num_rows
+                scanned['rows_collected'] += rows
+                increment('chaindensity_rows_processed_total', rows, stage='fetch')
+                shard_files.append(chunk_file_path)
+            report_progress(key, 'fetching', **scanned)
+            chunk_from, chunk = chunk_to, chunk + 1
+
+    # Sorting runs in the pool while other shards are still downloading
+    if not shard_files:
+        return None
+    sorted_file_path = f'{shard_directory}/sorted_{file_suffix}.parquet'
+    report_progress(key, 'sorting', from_block=from_block,
+                    to_block=to_block - 1)
+    stats = await run_in_process(
+        prepare_segment, shard_files, sorted_file_path, storage_format, timeout=None)
+    return sorted_file_path, stats
+
+
+def needs_compaction(manifest):
+    return (len(manifest['segments']) >= SEGMENT_COMPACT_MIN_SEGMENTS or
+            bool(manifest['retired']))
+
+
+def compact_segments(directory):
+    manifest = load_manifest(directory)
+    if manifest is None:
+        return
+
+    now = time.time()
+    # Delete replaced segments once no reader can still be using them
+    retired = []
+    for entry in manifest['retired']:
+        if now - entry['retired_at'] > SEGMENT_RETIRE_GRACE_SECONDS:
+            path = f"{segments_dir(directory)}/{entry['file']}"
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            retired.append(entry)
+    manifest['retired'] = retired
+
+    # Find the longest trailing run of small segments; older ones have already
+    # been compacted into large segments
+    run_start = len(manifest['segments'])
+    while (run_start > 0 and
+           manifest['segments'][run_start - 1]['rows'] < SEGMENT_COMPACT_MAX_ROWS):
+        run_start -= 1
+    run = manifest['segments'][run_start:]
+
+    if len(run) >= SEGMENT_COMPACT_MIN_SEGMENTS:
+        compacted_path = f"{directory}/compacted_{manifest['file_suffix']}.parquet"
+        writer = None
+        for segment in run:
+            table = pq.read_table(
+                f"{segments_dir(directory)}/{segment['file']}")
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    compacted_path, table.schema,
+                    **segment_write_options(manifest['storage_format']))
+            writer.write_table(table)
         writer.close()
 
+        segment_file = add_segment(directory, manifest, compacted_path)
+        manifest['segments'][run_start:] = [{
+            'file': segment_file,
+            'min_block': run[0]['min_block'],
+            'max_block': run[-1]['max_block'],
+            'rows': sum(segment['rows'] for segment in run),
+        }]
+        manifest['retired'].extend(
+            {'file': segment['file'], 'retired_at': now} for segment in run)
+        logger.info(
+            f"Compacted {len(run)} segments in {directory} into {segment_file}")
 
-async def fetch_data(address, selected_network, network_url, request_type):
-    client = hypersync.HypersyncClient(hypersync.ClientConfig(url=network_url))
+    write_manifest(directory, manifest)
 
-    is_event_request = request_type == "event"
-    directory = f"data/data_{selected_network}_{request_type}_{address}"
+
+async def compact_dataset(key, directory):
+    try:
+        async with get_dataset_lock(key):
+            await run_in_process(compact_segments, directory, timeout=None)
+    except Exception as e:
+        logger.error(f"Error compacting {directory}: {str(e)}", exc_info=True)
+
+
+def run_in_background(coro):
+    task = asyncio.ensure_future(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+
+def schedule_compaction(key, directory):
+    run_in_background(compact_dataset(key, directory))
+
+
+def dataset_key(address, selected_network, request_type):
+    return (selected_network, request_type, address)
+
+
+def dataset_directory(address, selected_network, request_type):
+    return f"data/data_{selected_network}_{request_type}_{address}"
+
+
+def publish_file(path, write):
+    # write(tmp_path) fills a temp file unique to this writer, which is then
+    # renamed into place, so readers in every worker see the old file or the
+    # complete new one
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def publish_json(path, value):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+    publish_file(path, write)
+
+
+def lock_path(name):
+    return f"{LOCK_DIR}/{name}.lock"
+
+
+@contextmanager
+def file_lock(name):
+    # Blocking cross-process lock for short critical sections off the event loop
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(lock_path(name), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def async_file_lock(name):
+    # Poll rather than block so the event loop keeps serving while another
+    # worker holds the lock
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(lock_path(name), 'a') as f:
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(FILE_LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def is_leader():
+    # The leader lock is held until the process exits, so another worker
+    # takes over as soon as the leader is gone
+    global _leader_lock
+    if _leader_lock is None:
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        f = open(lock_path('leader'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        _leader_lock = f
+        logger.info(f"Worker {os.getpid()} is the cache leader")
+    return True
+
+
+class DatasetLock:
+    # The asyncio lock queues tasks within this worker; the file lock then
+    # excludes the other workers sharing data/
+    def __init__(self, name):
+        self.name = name
+        self.lock = asyncio.Lock()
+        self._file_lock = None
+
+    def locked(self):
+        return self.lock.locked()
+
+    async def __aenter__(self):
+        await self.lock.acquire()
+        try:
+            self._file_lock = async_file_lock(self.name)
+            await self._file_lock.__aenter__()
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self._file_lock.__aexit__(*exc)
+        finally:
+            self._file_lock = None
+            self.lock.release()
+
+
+def get_dataset_lock(key):
+    lock = DATASET_LOCKS.get(key)
+    if lock is None:
+        selected_network, request_type, address = key
+        lock = DATASET_LOCKS[key] = DatasetLock(os.path.basename(
+            dataset_directory(address, selected_network, request_type)))
+    return lock
+
+
+async def open_dataset(directory, file_suffix):
+    # Bring an on-disk dataset up to date with the current layout before use
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    if (load_manifest(directory) is None and
+            os.path.exists(f'{directory}/{file_suffix}.parquet')):
+        await run_in_process(migrate_legacy_dataset, directory, file_suffix, timeout=None)
+
+    manifest = load_manifest(directory)
+    if manifest and manifest['segments'] and not pyramid_is_current(manifest):
+        await run_in_process(build_pyramid, directory, timeout=None)
+        manifest = load_manifest(directory)
+    return manifest
+
+
+def report_progress(key, stage, **info):
+    for listener in list(FETCH_LISTENERS.get(key, ())):
+        listener(stage, **info)
+
+
+def recently_synced(address, selected_network, request_type):
+    # Answer from the last synced state without any upstream call. Nothing
+    # is fetched, so there is no elapsed time to report.
+    directory = dataset_directory(address, selected_network, request_type)
+    manifest = load_manifest(directory)
+    if (not manifest or not manifest['segments'] or manifest['synced_at'] is None
+            or time.time() - manifest['synced_at'] > WARM_CACHE_MAX_STALENESS_SECONDS):
+        return None
+    total_blocks, total_items = manifest_stats(manifest)
+    return directory, total_blocks, total_items, None, resume_block(manifest), True
+
+
+async def fetch_data(address, selected_network, network_url, request_type, progress=None, strict=False, background=False):
+    key = dataset_key(address, selected_network, request_type)
+    if not strict:
+        result = recently_synced(address, selected_network, request_type)
+        if result is not None:
+            logger.info(f"Serving {key} from last synced state")
+            record_dataset_access(key, True)
+            return result
+
+    # Background refreshes must not count as accesses, or warmed datasets
+    # would keep themselves hot forever
+    if not background:
+        manifest = load_manifest(dataset_directory(
+            address, selected_network, request_type))
+        record_dataset_access(key, bool(manifest and manifest['segments']))
+
+    if progress is not None:
+        FETCH_LISTENERS.setdefault(key, []).append(progress)
+    try:
+        return await _join_fetch(key, address, selected_network, network_url, request_type)
+    finally:
+        if progress is not None:
+            FETCH_LISTENERS[key].remove(progress)
+            if not FETCH_LISTENERS[key]:
+                del FETCH_LISTENERS[key]
+
+
+async def _join_fetch(key, address, selected_network, network_url, request_type):
+    task = INFLIGHT_FETCHES.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_data_locked(
+            key, address, selected_network, network_url, request_type))
+        INFLIGHT_FETCHES[key] = task
+        task.add_done_callback(lambda _: INFLIGHT_FETCHES.pop(key, None))
+    else:
+        logger.info(f"Joining in-flight fetch for {key}")
+
+    # Shield so a disconnecting client doesn't cancel the fetch for everyone else
+    return await asyncio.shield(task)
+
+
+async def _fetch_data_locked(key, address, selected_network, network_url, request_type):
+    requested_at = time.time()
+    async with get_dataset_lock(key):
+        # Another worker may have synced the dataset while we waited
+        manifest = load_manifest(dataset_directory(
+            address, selected_network, request_type))
+        if manifest and manifest['synced_at'] is not None and manifest['synced_at'] >= requested_at:
+            result = recently_synced(address, selected_network, request_type)
+            if result is not None:
+                logger.info(f"Serving {key} as synced by another worker")
+                return result
+        return await _fetch_data(address, selected_network, network_url, request_type)
+
+
+async def _fetch_data(address, selected_network, network_url, request_type):
+    client = get_hypersync_client(network_url)
+    key = dataset_key(address, selected_network, request_type)
+
+    is_event_request = is_event_type(request_type)
+    directory = dataset_directory(address, selected_network, request_type)
     file_suffix = 'logs' if is_event_request else 'transactions'
-    file_path = f'{directory}/{file_suffix}.parquet'
 
     start_time = time.time()
     total_blocks = 0
     total_items = 0
 
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    is_cached = os.path.exists(file_path)
+    manifest = await open_dataset(directory, file_suffix)
+    is_cached = bool(manifest and manifest['segments'])
+    storage_format = manifest['storage_format'] if manifest else default_storage_format(
+        request_type)
 
     if is_cached:
-        existing_df = pl.scan_parquet(file_path)
-        last_block = existing_df.select(
-            pl.col("block_number").max()).collect().item()
-        start_block = int(last_block) + 1
+        start_block = resume_block(manifest)
         logger.info(f"Existing data found. Starting from block {start_block}")
+        total_blocks, total_items = manifest_stats(manifest)
+        report_progress(key, 'cached', total_blocks=total_blocks,
+                        total_items=total_items)
     else:
         start_block = 0
-        existing_df = None
         logger.info("No existing data found. Starting from block 0")
 
-    query = create_query(address, start_block, request_type)
     config = hypersync.StreamConfig(
         hex_output=hypersync.HexOutput.PREFIXED,
         column_mapping=ColumnMapping(
@@ -229,56 +2195,72 @@ async def fetch_data(address, selected_network, network_url, request_type):
 
     new_directory = f"{directory}_temp"
     try:
-        logger.info(f"Attempting to collect new data from block {start_block}")
-        await client.collect_parquet(new_directory, query, config)
-        logger.info("Finished writing new parquet folder")
-
-        new_file_path = f'{new_directory}/{file_suffix}.parquet'
-        if not os.path.exists(new_file_path):
+        # Pin the (exclusive) upper bound so the manifest knows exactly which
+        # blocks have been scanned. Stopping just short of the reported height
+        # means the newest block is picked up on the next refresh instead of
+        # risking it being skipped.
+        synced_head = await client.get_height() - 1
+        ranges = shard_ranges(start_block, synced_head + 1)
+        if start_block <= synced_head:
+            logger.info(f"Attempting to collect new data from block {
+                        start_block} to {synced_head} in {len(ranges)} shards")
+            report_progress(key, 'fetching', from_block=start_block, to_block=synced_head,
+                            shards=len(ranges), blocks_scanned=0, rows_collected=0)
+            semaphore = asyncio.Semaphore(FETCH_SHARD_CONCURRENCY)
+            scanned = {'blocks_scanned': 0, 'rows_collected': 0}
+            results = await asyncio.gather(*[
+                fetch_shard(client, address, request_type, from_block, to_block,
+                            f"{new_directory}/shard_{i:03d}", file_suffix, storage_format, config, semaphore,
+                            key, scanned)
+                for i, (from_block, to_block) in enumerate(ranges)
+            ], return_exceptions=True)
+            logger.info("Finished writing new parquet folder")
+        else:
+            results = []
+
+        # Commit shards in block order, keeping the contiguous prefix that
+        # succeeded so a failed shard only costs the blocks after it
+        found_data = False
+        for (from_block, to_block), result in zip(ranges, results):
+            if isinstance(result, BaseException):
+                raise result
+            if result is not None:
+                sorted_file_path, stats = result
+                report_progress(key, 'merging', from_block=from_block,
+                                to_block=to_block - 1, rows=stats['rows'])
+                manifest = await run_in_process(
+                    append_segment, directory, file_suffix, storage_format, sorted_file_path, stats, to_block - 1,
+                    timeout=None)
+                found_data = True
+            elif manifest and manifest['segments']:
+                record_sync(directory, manifest, to_block - 1)
+
+        if not found_data:
             logger.warning("No new data found.")
-            if existing_df is not None:
+            if is_cached:
                 logger.info("Using existing data as no new data was found")
-                combined_df = existing_df.collect()
+                record_sync(directory, manifest, synced_head)
             else:
                 raise ValueError("No existing data and no new data found.")
         else:
-            sorted_file_path = f"{directory}/sorted_{file_suffix}.parquet"
-            process_and_write_in_chunks(new_file_path, sorted_file_path)
+            request_data_cache_sweep()
+            if needs_compaction(manifest):
+                schedule_compaction(key, directory)
 
-            if existing_df is not None:
-                # Merge existing and new data
-                combined_df = pl.concat(
-                    [existing_df.collect(), pl.read_parquet(sorted_file_path)])
-                combined_df.sort("block_number").write_parquet(file_path)
-            else:
-                # Just rename the sorted file to the final file name
-                os.rename(sorted_file_path, file_path)
-
-        # Calculate statistics
-        final_df = pl.scan_parquet(file_path)
-        stats = final_df.select([
-            pl.col("block_number").min().alias("min_block"),
-            pl.col("block_number").max().alias("max_block"),
-            pl.count().alias("total_items")
-        ]).collect()
-
-        total_blocks = stats["max_block"][0] - stats["min_block"][0] + 1
-        total_items = stats["total_items"][0]
+        total_blocks, total_items = manifest_stats(manifest)
         logger.info(f"Total blocks: {
                     total_blocks}, Total items: {total_items}")
 
     except Exception as e:
         logger.error(f"Error during data collection: {str(e)}", exc_info=True)
-        if existing_df is not None:
+        if manifest and manifest['segments']:
             logger.info(
                 "Using existing data due to error in fetching new data")
-            stats = existing_df.select([
-                pl.col("block_number").min().alias("min_block"),
-                pl.col("block_number").max().alias("max_block"),
-                pl.count().alias("total_items")
-            ]).collect()
-            total_blocks = stats["max_block"][0] - stats["min_block"][0] + 1
-            total_items = stats["total_items"][0]
+            total_blocks, total_items = manifest_stats(manifest)
+        elif isinstance(e, ProcessPoolBusyError):
+            # An overloaded pool says nothing about the address; without
+            # cached data to fall back on, let the caller answer 503
+            raise
         else:
             logger.warning("No data available")
             total_blocks = 0
@@ -292,15 +2274,514 @@ async def fetch_data(address, selected_network, network_url, request_type):
     return directory, total_blocks, total_items, elapsed_time, start_block, is_cached
 
 
+def split_batch(new_file_path, output_directory, file_suffix, request_type, targets):
+    # targets maps address -> (start_block, storage_format). Each address only
+    # keeps rows past its own resume point, and a transaction between two
+    # batch addresses counts for both.
+    df = pl.scan_parquet(new_file_path)
+    # Signature datasets carry topic0 through to their segments
+    extra = ['topic0'] if request_type == SIGNATURE_REQUEST_TYPE else []
+    if is_event_type(request_type):
+        matches = df.select(['block_number', pl.col(
+            'address').str.to_lowercase(), *extra])
+    else:
+        senders = df.select(['block_number', pl.col(
+            'from').str.to_lowercase().alias('address')])
+        receivers = df.filter(pl.col('to').str.to_lowercase() != pl.col('from').str.to_lowercase()).select(
+            ['block_number', pl.col('to').str.to_lowercase().alias('address')])
+        matches = pl.concat([senders, receivers])
+
+    start_blocks = pl.LazyFrame({
+        'address': list(targets),
+        'start_block': [start_block for start_block, _ in targets.values()],
+    })
+    matches = matches.join(start_blocks, on='address').filter(
+        pl.col('block_number') >= pl.col('start_block')).select(['address', 'block_number', *extra]).collect()
+
+    results = {}
+    for (address,), rows in matches.partition_by('address', as_dict=True).items():
+        rows_path = f"{output_directory}/{address}_{file_suffix}.parquet"
+        sorted_file_path = f"{output_directory}/{address}_sorted_{file_suffix}.parquet"
+        rows.drop('address').write_parquet(rows_path)
+        stats = prepare_segment(rows_path, sorted_file_path,
+                                targets[address][1])
+        results[address] = (sorted_file_path, stats)
+    return results
+
+
+async def fetch_batch(addresses, selected_network, network_url, request_type):
+    client = get_hypersync_client(network_url)
+    file_suffix = 'logs' if is_event_type(request_type) else 'transactions'
+    start_time = time.time()
+
+    keys = sorted(dataset_key(address, selected_network, request_type)
+                  for address in addresses)
+    async with AsyncExitStack() as stack:
+        # Lock in a fixed order so overlapping batches can't deadlock
+        for key in keys:
+            await stack.enter_async_context(get_dataset_lock(key))
+
+        datasets = {}
+        for address in addresses:
+            directory = dataset_directory(
+                address, selected_network, request_type)
+            manifest = await open_dataset(directory, file_suffix)
+            is_cached = bool(manifest and manifest['segments'])
+            record_dataset_access(dataset_key(
+                address, selected_network, request_type), is_cached)
+            datasets[address] = {
+                'directory': directory,
+                'manifest': manifest,
+                'is_cached': is_cached,
+                'start_block': resume_block(manifest) if is_cached else 0,
+                'storage_format': manifest['storage_format'] if manifest else default_storage_format(request_type),
+            }
+
+        # One upstream pass from the earliest resume point covers everyone
+        start_block = min(dataset['start_block']
+                          for dataset in datasets.values())
+        synced_head = await client.get_height() - 1
+        os.makedirs('data', exist_ok=True)
+        new_directory = tempfile.mkdtemp(
+            prefix=f"batch_{selected_network}_{request_type}_", dir='data')
+        try:
+            results = {}
+            if start_block <= synced_head:
+                query = create_query(
+                    addresses, start_block, request_type, select_address=True)
+                query.to_block = synced_head + 1
+                config = hypersync.StreamConfig(
+                    hex_output=hypersync.HexOutput.PREFIXED,
+                    column_mapping=ColumnMapping(
+                        log={LogField.BLOCK_NUMBER: DataType.INT64},
+                        transaction={
+                            TransactionField.BLOCK_NUMBER: DataType.INT64},
+                    ),
+                )
+                logger.info(f"Collecting {len(addresses)} addresses from block {
+                            start_block} to {synced_head}")
+                with timed('fetch'):
+                    await client.collect_parquet(new_directory, query, config)
+
+                new_file_path = f'{new_directory}/{file_suffix}.parquet'
+                if os.path.exists(new_file_path):
+                    targets = {address: (dataset['start_block'], dataset['storage_format'])
+                               for address, dataset in datasets.items()}
+                    results = await run_in_process(
+                        split_batch, new_file_path, new_directory, file_suffix, request_type, targets,
+                        timeout=None)
+
+            for address, dataset in datasets.items():
+                if address in results:
+                    sorted_file_path, stats = results[address]
+                    dataset['manifest'] = await run_in_process(
+                        append_segment, dataset['directory'], file_suffix, dataset['storage_format'],
+                        sorted_file_path, stats, synced_head, timeout=None)
+                    if needs_compaction(dataset['manifest']):
+                        schedule_compaction(dataset_key(
+                            address, selected_network, request_type), dataset['directory'])
+                elif dataset['is_cached'] and start_block <= synced_head:
+                    record_sync(dataset['directory'],
+                                dataset['manifest'], synced_head)
+        finally:
+            shutil.rmtree(new_directory, ignore_errors=True)
+
+    request_data_cache_sweep()
+    elapsed_time = time.time() - start_time
+    return datasets, elapsed_time
+
+
+def batch_interval_counts(datasets):
+    return {address: compute_interval_counts(directory, manifest)
+            for address, (directory, manifest) in datasets.items()}
+
+
+def parse_dataset_name(name):
+    # data_{network}_{request_type}_{address}; network names may contain '_'
+    network, request_type, address = name[len('data_'):].rsplit('_', 2)
+    return network, request_type, address
+
+
+def record_dataset_access(key, hit):
+    increment('chaindensity_cache_requests_total', cache='dataset',
+              result='hit' if hit else 'miss')
+    selected_network, request_type, address = key
+    name = os.path.basename(dataset_directory(
+        address, selected_network, request_type))
+    now = time.time()
+    for entries in (DATA_CACHE_INDEX, DATA_CACHE_ACCESSES):
+        entry = entries.setdefault(
+            name, {'size': 0, 'last_access': 0, 'hits': 0})
+        entry['last_access'] = now
+        entry['hits'] += 1
+    DATA_CACHE_STATS['hits' if hit else 'misses'] += 1
+
+
+def read_data_cache_index():
+    try:
+        with open(DATA_CACHE_INDEX_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_data_cache_index():
+    DATA_CACHE_INDEX.update(read_data_cache_index())
+
+
+def replace_data_cache_index(index):
+    DATA_CACHE_INDEX.clear()
+    DATA_CACHE_INDEX.update(index)
+
+
+def take_data_cache_accesses():
+    accesses = dict(DATA_CACHE_ACCESSES)
+    DATA_CACHE_ACCESSES.clear()
+    return accesses
+
+
+def merge_data_cache_index(accesses, sizes=None, evicted=()):
+    # Read-modify-write of the shared index: every worker adds the accesses
+    # it recorded, and only the sweeping worker sets sizes and drops entries
+    with file_lock('cache_index'):
+        index = read_data_cache_index()
+        for name, access in accesses.items():
+            entry = index.setdefault(
+                name, {'size': 0, 'last_access': 0, 'hits': 0})
+            entry['last_access'] = max(entry['last_access'], access['last_access'])
+            entry['hits'] += access['hits']
+        if sizes is not None:
+            now = time.time()
+            for name in list(index):
+                # A dataset accessed recently may still be on its first fetch
+                if name not in sizes and now - index[name]['last_access'] >= DATA_CACHE_MIN_IDLE_SECONDS:
+                    del index[name]
+            for name, size in sizes.items():
+                # Datasets found on disk without an index entry count as coldest
+                index.setdefault(
+                    name, {'size': 0, 'last_access': 0, 'hits': 0})['size'] = size
+        for name in evicted:
+            index.pop(name, None)
+        publish_json(DATA_CACHE_INDEX_PATH, index)
+    return index
+
+
+async def flush_data_cache_accesses():
+    index = await asyncio.to_thread(
+        merge_data_cache_index, take_data_cache_accesses())
+    replace_data_cache_index(index)
+
+
+def scan_dataset_sizes():
+    sizes = {}
+    if not os.path.exists('data'):
+        return sizes
+    for entry in os.scandir('data'):
+        if (entry.is_dir() and entry.name.startswith('data_')
+                and not entry.name.endswith('_temp')):
+            sizes[entry.name] = sum(
+                os.path.getsize(os.path.join(root, file))
+                for root, _, files in os.walk(entry.path) for file in files)
+    return sizes
+
+
+def dataset_in_use(name, entry, now):
+    network, request_type, address = parse_dataset_name(name)
+    key = dataset_key(address, network, request_type)
+    lock = DATASET_LOCKS.get(key)
+    return (key in INFLIGHT_FETCHES or (lock is not None and lock.locked())
+            or now - entry['last_access'] < DATA_CACHE_MIN_IDLE_SECONDS)
+
+
+async def sweep_data_cache():
+    sizes = await asyncio.to_thread(scan_dataset_sizes)
+    index = await asyncio.to_thread(
+        merge_data_cache_index, take_data_cache_accesses(), sizes)
+    replace_data_cache_index(index)
+
+    total = sum(sizes.values())
+    evicted = []
+    if total > DATA_CACHE_MAX_BYTES:
+        if DATA_CACHE_EVICTION_POLICY == 'lfu':
+            def order(item): return (item[1]['hits'], item[1]['last_access'])
+        else:
+            def order(item): return item[1]['last_access']
+
+        now = time.time()
+        for name, entry in sorted(DATA_CACHE_INDEX.items(), key=order):
+            if total <= DATA_CACHE_MAX_BYTES:
+                break
+            if name not in sizes or dataset_in_use(name, entry, now):
+                continue
+            network, request_type, address = parse_dataset_name(name)
+            # Hold the dataset lock so no fetch in any worker starts while
+            # files disappear, and re-check in case one finished while we
+            # waited for it or another worker has since published an access.
+            # The manifest catches a sync that no index has recorded yet.
+            async with get_dataset_lock(dataset_key(address, network, request_type)):
+                shared = await asyncio.to_thread(read_data_cache_index)
+                manifest = await asyncio.to_thread(load_manifest, f"data/{name}") or {}
+                last_access = max(entry['last_access'],
+                                  shared.get(name, entry)['last_access'],
+                                  DATA_CACHE_ACCESSES.get(name, entry)['last_access'],
+                                  manifest.get('synced_at') or 0,
+                                  manifest.get('modified_at') or 0)
+                if time.time() - last_access < DATA_CACHE_MIN_IDLE_SECONDS:
+                    continue
+                await asyncio.to_thread(shutil.rmtree, f"data/{name}", True)
+            total -= entry['size']
+            DATA_CACHE_STATS['evictions'] += 1
+            DATA_CACHE_STATS['evicted_bytes'] += entry['size']
+            del DATA_CACHE_INDEX[name]
+            evicted.append(name)
+            logger.info(f"Evicted {name} ({entry['size']} bytes)")
+
+    if evicted:
+        index = await asyncio.to_thread(
+            merge_data_cache_index, take_data_cache_accesses(), None, evicted)
+        replace_data_cache_index(index)
+    return total
+
+
+async def data_cache_sweeper():
+    # Every worker publishes its accesses each DATA_CACHE_FLUSH_SECONDS; only
+    # the leader scans sizes and evicts
+    last_sweep = time.monotonic()
+    while True:
+        try:
+            await asyncio.wait_for(_data_cache_sweep.wait(), DATA_CACHE_FLUSH_SECONDS)
+            requested = True
+        except asyncio.TimeoutError:
+            requested = False
+        _data_cache_sweep.clear()
+        try:
+            if is_leader() and (requested or time.monotonic() - last_sweep >= DATA_CACHE_SWEEP_SECONDS):
+                last_sweep = time.monotonic()
+                await sweep_data_cache()
+            else:
+                await flush_data_cache_accesses()
+        except Exception as e:
+            logger.error(f"Error sweeping data cache: {str(e)}", exc_info=True)
+
+
+def request_data_cache_sweep():
+    # Wake the sweeper early after new data lands on disk
+    if _data_cache_sweep is not None:
+        _data_cache_sweep.set()
+
+
+def chain_refresh_interval(selected_network):
+    return WARM_CACHE_INTERVALS.get(selected_network, WARM_CACHE_DEFAULT_INTERVAL)
+
+
+def hot_datasets(now):
+    recent = [(name, entry) for name, entry in DATA_CACHE_INDEX.items()
+              if now - entry['last_access'] < WARM_CACHE_WINDOW_SECONDS]
+    recent.sort(key=lambda item: item[1]['hits'], reverse=True)
+    return [parse_dataset_name(name) for name, _ in recent[:WARM_CACHE_SIZE]]
+
+
+async def refresh_dataset(address, selected_network, network_url, request_type, semaphore, refreshing):
+    key = dataset_key(address, selected_network, request_type)
+    try:
+        async with semaphore:
+            await fetch_data(address, selected_network, network_url, request_type, strict=True, background=True)
+    except Exception as e:
+        logger.error(f"Error refreshing {key}: {str(e)}", exc_info=True)
+    finally:
+        refreshing.discard(key)
+
+
+async def warm_cache_scheduler():
+    semaphore = asyncio.Semaphore(WARM_CACHE_CONCURRENCY)
+    refreshing = set()
+    while True:
+        await asyncio.sleep(WARM_CACHE_TICK_SECONDS)
+        # The leader's index holds every worker's accesses; the others would
+        # only repeat its refreshes
+        if not is_leader():
+            continue
+        now = time.time()
+        for selected_network, request_type, address in hot_datasets(now):
+            key = dataset_key(address, selected_network, request_type)
+            if key in refreshing or key in INFLIGHT_FETCHES or selected_network not in CHAIN_DATA:
+                continue
+            manifest = load_manifest(dataset_directory(
+                address, selected_network, request_type))
+            if not manifest or manifest['synced_at'] is None:
+                continue
+            if now - manifest['synced_at'] < chain_refresh_interval(selected_network):
+                continue
+            refreshing.add(key)
+            run_in_background(refresh_dataset(
+                address, selected_network, CHAIN_DATA[selected_network]['url'], request_type, semaphore, refreshing))
+
+
+def is_dataset_cached(address, selected_network, request_type):
+    manifest = load_manifest(dataset_directory(
+        address, selected_network, request_type))
+    return bool(manifest and manifest['segments'])
+
+
+def memory_pressure():
+    if JOB_MAX_RSS_MB and psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024 > JOB_MAX_RSS_MB:
+        return True
+    return psutil.virtual_memory().available / 1024 / 1024 < JOB_MIN_AVAILABLE_MB
+
+
+def overloaded(message):
+    logger.warning(f"Rejecting request: {message}")
+    log_memory_usage()
+    return {"error": message}, 429, {'Retry-After': str(JOB_RETRY_AFTER_SECONDS)}
+
+
+def submit_job(params, priority):
+    global _job_sequence
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'queued',
+        'stage': None,
+        'params': params,
+        'priority': priority,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'result': None,
+        'error': None,
+    }
+    JOBS[job['id']] = job
+    publish_job(job)
+    # The sequence number keeps equal priorities first-in first-out
+    _job_sequence += 1
+    _job_queue.put_nowait((priority, _job_sequence, job['id']))
+    return job
+
+
+def job_status(job):
+    status = {key: job[key] for key in (
+        'id', 'status', 'stage', 'created_at', 'started_at', 'finished_at')}
+    if job['status'] == 'done':
+        status['result'] = job['result']
+    elif job['status'] == 'failed':
+        status['error'] = job['error']
+    return status
+
+
+def job_status_path(job_id):
+    return f"{JOB_STATUS_DIR}/{job_id}.json"
+
+
+def publish_job(job):
+    # Status polls may land on any worker, not only the one running the job
+    publish_json(job_status_path(job['id']), job_status(job))
+
+
+def published_job_status(job_id):
+    # Job ids are hex uuids; anything else can't name a published status
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(job_status_path(job_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def prune_jobs():
+    cutoff = time.time() - JOB_RESULT_TTL_SECONDS
+    for job_id in [job_id for job_id, job in JOBS.items()
+                   if job['finished_at'] is not None and job['finished_at'] < cutoff]:
+        del JOBS[job_id]
+    if is_leader() and os.path.exists(JOB_STATUS_DIR):
+        for entry in os.scandir(JOB_STATUS_DIR):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def queued_jobs():
+    queued = _job_queue.qsize() if _job_queue is not None else 0
+    return queued + sum(len(jobs) for jobs in DEFERRED_COLD_JOBS.values())
+
+
+def set_job_stage(job, stage):
+    if job['stage'] != stage:
+        job['stage'] = stage
+        publish_job(job)
+
+
+def release_cold_fetch(selected_network):
+    COLD_FETCHES[selected_network] -= 1
+    # Hand the freed slot to the oldest job set aside for this chain; it
+    # keeps its place in the queue order
+    deferred = DEFERRED_COLD_JOBS.get(selected_network)
+    if deferred:
+        _job_queue.put_nowait(deferred.popleft())
+
+
+async def run_job(job):
+    params = job['params']
+    selected_network = params['network']
+    network_url = CHAIN_DATA.get(selected_network, {}).get(
+        'url', "https://eth.hypersync.xyz")
+
+    job['status'] = 'running'
+    job['started_at'] = time.time()
+    publish_job(job)
+    return await data_result(
+        params['address'], selected_network, network_url, params['type'], params['format'], params['strict'],
+        lambda stage, **info: set_job_stage(job, stage), params['bucket'])
+
+
+async def job_worker():
+    while True:
+        entry = await _job_queue.get()
+        job = JOBS.get(entry[2])
+        if job is None:
+            continue
+        job_id = job['id']
+        selected_network = job['params']['network']
+        # Re-check: the dataset may have been fetched while the job was queued
+        cold = not is_dataset_cached(
+            job['params']['address'], selected_network, job['params']['type'])
+        if cold:
+            if COLD_FETCHES.get(selected_network, 0) >= JOB_MAX_COLD_PER_CHAIN:
+                set_job_stage(job, 'waiting')
+                DEFERRED_COLD_JOBS.setdefault(selected_network, deque()).append(entry)
+                continue
+            COLD_FETCHES[selected_network] = COLD_FETCHES.get(selected_network, 0) + 1
+        try:
+            result = await run_job(job)
+            if result is None:
+                job['status'] = 'failed'
+                job['error'] = f"No {job['params']['type']}s found for {job['params']['address']} on the {job['params']['network']} network."
+            else:
+                job['status'] = 'done'
+                job['result'] = result
+        except ServiceUnavailableError as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        except Exception as e:
+            logger.error(f"Error running job {job_id}: {str(e)}", exc_info=True)
+            job['status'] = 'failed'
+            job['error'] = f"An unexpected error occurred. Error: {str(e)}"
+        finally:
+            if cold:
+                release_cold_fetch(selected_network)
+            job['finished_at'] = time.time()
+            publish_job(job)
+
+
 def analyze_data(directory, request_type):
     logger.info(f"Starting analyze_data function for {request_type}")
-    file_path = f"{directory}/{'logs' if request_type ==
-                               'event' else 'transactions'}.parquet"
-    logger.info(f"Attempting to read Parquet file: {file_path}")
+    logger.info(f"Attempting to scan dataset segments in: {directory}")
 
     try:
-        df = pl.read_parquet(file_path)
-        logger.info(f"Successfully read Parquet file. Shape: {df.shape}")
+        df = scan_dataset(directory)
+        logger.info(f"Successfully scanned dataset. Schema: {
+                    df.collect_schema()}")
         return df
     except Exception as e:
         logger.error(f"Error reading or processing Parquet file: {
@@ -350,8 +2831,602 @@ signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
 
-def create_plot(directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached):
+def interval_size_for(min_block, max_block):
+    return max(5000, round_based_on_magnitude((max_block - min_block) / 50))
+
+
+def compute_interval_counts(directory, manifest):
+    # One streaming group-by over every segment. Compact segments already
+    # carry per-block counts, row segments contribute one per row.
+    min_block = manifest['min_block']
+    max_block = manifest['max_block']
+    interval_size = interval_size_for(min_block, max_block)
+    min_block_rounded = min_block - (min_block % interval_size)
+    num_intervals = (max_block - min_block_rounded) // interval_size + 1
+
+    if manifest['storage_format'] == 'compact':
+        counted = pl.col('count').sum()
+    else:
+        counted = pl.len()
+    with timed('binning'):
+        interval_counts = scan_dataset(directory, manifest).group_by(
+            ((pl.col('block_number') - min_block_rounded) //
+             interval_size).alias('interval_index')
+        ).agg(counted.cast(pl.Int64).alias('count')).collect(engine='streaming')
+    increment('chaindensity_rows_processed_total',
+              manifest['row_count'], stage='binning')
+
+    full_range = pl.DataFrame(
+        {'interval_index': pl.arange(0, num_intervals, eager=True)})
+    interval_counts = full_range.join(
+        interval_counts, on='interval_index', how='left').fill_null(0)
+
+    interval_counts = interval_counts.with_columns([
+        (pl.col('interval_index') * interval_size +
+         min_block_rounded).alias('interval_start'),
+        ((pl.col('interval_index') + 1) * interval_size +
+         min_block_rounded).alias('interval_end'),
+        pl.col('count').cum_sum().alias('cumulative'),
+    ])
+    return interval_counts, interval_size
+
+
+def signature_name(topic0):
+    if topic0 is None:
+        return 'Other'
+    return KNOWN_EVENT_SIGNATURES.get(topic0, f"{topic0[:10]}…")
+
+
+def compute_signature_counts(directory, manifest, top_n=SIGNATURE_TOP_N):
+    # Same intervals as compute_interval_counts, split by topic0. Grouping on
+    # the categorical keeps the hashes as dictionary indices throughout.
+    min_block = manifest['min_block']
+    max_block = manifest['max_block']
+    interval_size = interval_size_for(min_block, max_block)
+    min_block_rounded = min_block - (min_block % interval_size)
+    num_intervals = (max_block - min_block_rounded) // interval_size + 1
+
+    with timed('binning'):
+        counts = scan_dataset(directory, manifest).group_by(
+            ((pl.col('block_number') - min_block_rounded) //
+             interval_size).alias('interval_index'),
+            pl.col('topic0').cast(pl.Categorical),
+        ).agg(pl.len().cast(pl.Int64).alias('count')).collect(engine='streaming')
+    increment('chaindensity_rows_processed_total',
+              manifest['row_count'], stage='binning')
+
+    counts = counts.with_columns(pl.col('topic0').cast(pl.String))
+    totals = counts.group_by('topic0').agg(pl.col('count').sum()).sort(
+        ['count', 'topic0'], descending=[True, False], nulls_last=True)
+    top = totals.filter(pl.col('topic0').is_not_null()).head(top_n)['topic0'].to_list()
+    # Anonymous logs and the long tail are lumped together
+    counts = counts.with_columns(
+        pl.when(pl.col('topic0').is_in(top)).then(pl.col('topic0')).alias('topic0'))
+
+    columns = top + ([None] if counts['topic0'].null_count() else [])
+    series = {}
+    for topic0 in columns:
+        matched = counts.filter(pl.col('topic0').is_null() if topic0 is None
+                                else pl.col('topic0') == topic0)
+        dense = np.zeros(num_intervals, dtype=np.int64)
+        np.add.at(dense, matched['interval_index'].to_numpy(),
+                  matched['count'].to_numpy())
+        series[topic0] = dense
+
+    total = sum(series.values(), np.zeros(num_intervals, dtype=np.int64))
+    interval_index = np.arange(num_intervals)
+    interval_counts = pl.DataFrame({
+        'interval_index': interval_index,
+        'interval_start': interval_index * interval_size + min_block_rounded,
+        'interval_end': (interval_index + 1) * interval_size + min_block_rounded,
+        'count': total,
+        'cumulative': np.cumsum(total),
+    })
+    signatures = [{
+        'topic0': topic0,
+        'name': signature_name(topic0),
+        'total': int(dense.sum()),
+        'counts': dense,
+    } for topic0, dense in series.items()]
+    return interval_counts, interval_size, signatures
+
+
+class TimestampIndexUnavailableError(ServiceUnavailableError):
+    pass
+
+
+def timestamp_index_path(selected_network):
+    return f"{TIMESTAMP_INDEX_DIR}/{selected_network}-{TIMESTAMP_INDEX_STRIDE}.u32"
+
+
+def load_timestamp_index(selected_network):
+    path = timestamp_index_path(selected_network)
+    if not os.path.exists(path) or os.path.getsize(path) < 4:
+        return None
+    # Only whole entries: a concurrent append may be half written
+    return np.memmap(path, dtype='<u4', mode='r', shape=(os.path.getsize(path) // 4,))
+
+
+def timestamp_index_head(selected_network):
+    path = timestamp_index_path(selected_network)
+    entries = os.path.getsize(path) // 4 if os.path.exists(path) else 0
+    return (entries - 1) * TIMESTAMP_INDEX_STRIDE
+
+
+def extend_timestamp_index(selected_network, blocks_path, from_block):
+    blocks = pl.scan_parquet(blocks_path).select(['number', 'timestamp']).filter(
+        pl.col('number') % TIMESTAMP_INDEX_STRIDE == 0).sort('number').collect()
+    expected = np.arange(from_block, from_block + len(blocks) * TIMESTAMP_INDEX_STRIDE,
+                         TIMESTAMP_INDEX_STRIDE)
+    # Append only the gap-free prefix so entry i always maps to block i * stride
+    gaps = np.flatnonzero(blocks['number'].to_numpy() != expected)
+    count = gaps[0] if len(gaps) else len(blocks)
+    timestamps = blocks['timestamp'].to_numpy()[:count].astype('<u4')
+    os.makedirs(TIMESTAMP_INDEX_DIR, exist_ok=True)
+    with open(timestamp_index_path(selected_network), 'ab') as f:
+        f.write(timestamps.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+async def ensure_timestamp_index(selected_network, network_url, max_block):
+    # Single flight per chain; every dataset on the chain shares one index.
+    # A joined extension may have started below max_block, so try twice.
+    for _ in range(2):
+        # Blocks within one stride of the last sample are interpolated
+        # against the next sample or clamped to the last one
+        if timestamp_index_head(selected_network) + TIMESTAMP_INDEX_STRIDE > max_block:
+            return
+        task = TIMESTAMP_INDEX_FETCHES.get(selected_network)
+        if task is None:
+            task = asyncio.ensure_future(
+                _extend_timestamp_index(selected_network, network_url))
+            TIMESTAMP_INDEX_FETCHES[selected_network] = task
+            task.add_done_callback(
+                lambda _: TIMESTAMP_INDEX_FETCHES.pop(selected_network, None))
+        await asyncio.shield(task)
+    # Later blocks would all be clamped into the last bucket; an upstream gap
+    # or lag stopped the extension, so ask the client to retry instead
+    if timestamp_index_head(selected_network) + TIMESTAMP_INDEX_STRIDE <= max_block:
+        raise TimestampIndexUnavailableError(
+            f"Block timestamps for {selected_network} are not available up to block {max_block} yet, try again later.")
+
+
+async def _extend_timestamp_index(selected_network, network_url):
+    # One worker extends a chain's index at a time; the head is read under
+    # the lock so the others continue from wherever it stopped
+    async with async_file_lock(f"timestamps_{selected_network}"):
+        client = get_hypersync_client(network_url)
+        from_block = timestamp_index_head(selected_network) + TIMESTAMP_INDEX_STRIDE
+        synced_head = await client.get_height() - 1
+        config = hypersync.StreamConfig(
+            hex_output=hypersync.HexOutput.PREFIXED,
+            column_mapping=ColumnMapping(
+                block={hypersync.BlockField.NUMBER: DataType.INT64,
+                       hypersync.BlockField.TIMESTAMP: DataType.INT64},
+            ),
+        )
+        while from_block <= synced_head:
+            to_block = min(from_block + TIMESTAMP_INDEX_FETCH_BLOCKS, synced_head + 1)
+            query = hypersync.Query(
+                from_block=from_block,
+                to_block=to_block,
+                include_all_blocks=True,
+                field_selection=FieldSelection(
+                    block=[hypersync.BlockField.NUMBER, hypersync.BlockField.TIMESTAMP]),
+            )
+            with tempfile.TemporaryDirectory(dir=os.path.dirname(TIMESTAMP_INDEX_DIR) or None) as directory:
+                logger.info(f"Collecting {selected_network} block timestamps from block {from_block} to {to_block}")
+                with timed('fetch'):
+                    await client.collect_parquet(directory, query, config)
+                blocks_path = f"{directory}/blocks.parquet"
+                if not os.path.exists(blocks_path):
+                    return
+                count = await run_in_process(
+                    extend_timestamp_index, selected_network, blocks_path, from_block, timeout=None)
+            logger.info(f"Extended {selected_network} timestamp index by {count} entries")
+            next_block = timestamp_index_head(selected_network) + TIMESTAMP_INDEX_STRIDE
+            # A gap in the headers stops the prefix short; retry on the next request
+            if next_block < to_block:
+                return
+            from_block = next_block
+
+
+def block_timestamps(index, blocks):
+    # Linear interpolation between sampled blocks, clamped to the index
+    last = len(index) - 1
+    position = blocks / TIMESTAMP_INDEX_STRIDE
+    lower = np.minimum(position.astype(np.int64), last)
+    upper = np.minimum(lower + 1, last)
+    fraction = np.clip(position - lower, 0, 1)
+    low_times = index[lower].astype(np.int64)
+    return low_times + ((index[upper].astype(np.int64) - low_times) * fraction).astype(np.int64)
+
+
+def block_counts(directory, manifest):
+    # Compact segments already hold one row per block, and segments never
+    # share blocks, so only row segments need grouping
+    scan = scan_dataset(directory, manifest)
+    if manifest['storage_format'] == 'compact':
+        return scan.select(['block_number', pl.col('count').cast(pl.Int64)])
+    return scan.group_by('block_number').agg(pl.len().cast(pl.Int64).alias('count'))
+
+
+def compute_analytics(directory, manifest, top_k=ANALYTICS_TOP_K):
+    per_block = block_counts(directory, manifest).sort('block_number').with_columns(
+        (pl.col('block_number').shift(1) + 1).alias('gap_start'),
+        (pl.col('block_number') - pl.col('block_number').shift(1) - 1).alias('gap_blocks'))
+    with timed('analytics'):
+        # Every statistic is an aggregate of the same sorted per-block frame,
+        # so the dataset is scanned once
+        row = per_block.select(
+            pl.col('block_number').min().alias('first_active_block'),
+            pl.col('block_number').max().alias('last_active_block'),
+            pl.len().alias('active_blocks'),
+            pl.col('count').quantile(0.5, 'nearest').alias('p50'),
+            pl.col('count').quantile(0.95, 'nearest').alias('p95'),
+            pl.col('count').quantile(0.99, 'nearest').alias('p99'),
+            pl.col('count').mean().alias('mean'),
+            # Ties go to the earliest block
+            pl.struct('block_number', 'count').top_k_by(
+                ['count', 'block_number'], top_k, reverse=[False, True]).implode().alias('busiest_blocks'),
+            pl.struct(
+                pl.col('gap_start').alias('start_block'),
+                (pl.col('gap_start') + pl.col('gap_blocks') - 1).alias('end_block'),
+                pl.col('gap_blocks').alias('blocks'),
+            ).top_k_by(['gap_blocks', 'gap_start'], top_k, reverse=[False, True]).implode().alias('longest_gaps'),
+        ).collect(engine='streaming').row(0, named=True)
+    increment('chaindensity_rows_processed_total',
+              manifest['row_count'], stage='analytics')
+
+    span = row['last_active_block'] - row['first_active_block'] + 1
+    return {
+        'first_active_block': row['first_active_block'],
+        'last_active_block': row['last_active_block'],
+        'active_blocks': row['active_blocks'],
+        'active_block_ratio': row['active_blocks'] / span,
+        'items_per_active_block': {
+            'mean': row['mean'],
+            'p50': row['p50'],
+            'p95': row['p95'],
+            'p99': row['p99'],
+        },
+        # top_k_by leaves the order of the selected rows unspecified
+        'busiest_blocks': sorted(row['busiest_blocks'],
+                                 key=lambda block: (-block['count'], block['block_number'])),
+        # The first block has no gap before it and adjacent blocks have none
+        'longest_gaps': sorted((gap for gap in row['longest_gaps'] if gap['blocks']),
+                               key=lambda gap: (-gap['blocks'], gap['start_block'])),
+    }
+
+
+def cached_analytics(directory, manifest):
+    path = f"{directory}/analytics.json"
+    version = dataset_version(manifest)
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if cached['version'] == version and cached['top_k'] == ANALYTICS_TOP_K:
+            return cached['analytics']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    analytics = compute_analytics(directory, manifest)
+    publish_json(path, {'version': version, 'top_k': ANALYTICS_TOP_K,
+                        'analytics': analytics})
+    return analytics
+
+
+def compute_time_counts(directory, manifest, bucket, selected_network):
+    index = load_timestamp_index(selected_network)
+    if index is None:
+        raise ValueError(f"No block timestamps for {selected_network}")
+    bucket_seconds = TIME_BUCKETS[bucket]
+
+    with timed('binning'):
+        per_block = block_counts(
+            directory, manifest).collect(engine='streaming')
+        timestamps = block_timestamps(
+            index, per_block['block_number'].to_numpy())
+        bucket_index = timestamps // bucket_seconds
+        first = int(bucket_index.min())
+        counts = np.bincount(bucket_index - first,
+                             weights=per_block['count'].to_numpy()).astype(np.int64)
+    increment('chaindensity_rows_processed_total',
+              manifest['row_count'], stage='binning')
+
+    starts = (np.arange(len(counts)) + first) * bucket_seconds
+    interval_counts = pl.DataFrame({
+        'interval_start': starts,
+        'interval_end': starts + bucket_seconds,
+        'count': counts,
+    }).with_columns(pl.col('count').cum_sum().alias('cumulative'))
+    return interval_counts, bucket_seconds
+
+
+def bucket_counts(directory, manifest, bucket, selected_network):
+    if bucket == 'block':
+        return compute_interval_counts(directory, manifest)
+    return compute_time_counts(directory, manifest, bucket, selected_network)
+
+
+async def bucketed_counts(directory, manifest, bucket, selected_network, network_url):
+    if bucket != 'block':
+        await ensure_timestamp_index(selected_network, network_url, manifest['max_block'])
+    return await run_in_process(bucket_counts, directory, manifest, bucket, selected_network)
+
+
+def bucket_label(start, end, bucket):
+    if bucket == 'block':
+        return f"{format_with_commas(int(start))}-{format_with_commas(int(end))}"
+    moment = datetime.fromtimestamp(int(start), tz=timezone.utc)
+    return moment.strftime('%Y-%m-%d %H:00' if bucket == 'hour' else '%Y-%m-%d')
+
+
+def bucket_title(request_type, bucket, interval_size):
+    item_type = 'Events' if is_event_type(request_type) else 'Transactions'
+    if bucket == 'block':
+        return f'Number of {item_type} per Block Interval (Size {format_with_commas(interval_size)})'
+    return f'Number of {item_type} per {bucket.capitalize()} (UTC)'
+
+
+def interval_bins(interval_counts, signatures=()):
+    bins = {
+        "start": interval_counts['interval_start'].to_list(),
+        "end": interval_counts['interval_end'].to_list(),
+        "count": interval_counts['count'].to_list(),
+        "cumulative": interval_counts['cumulative'].to_list(),
+    }
+    if signatures:
+        bins["by_signature"] = {signature_key(signature): signature['counts'].tolist()
+                                for signature in signatures}
+    return bins
+
+
+def signature_key(signature):
+    return signature['topic0'] or 'other'
+
+
+def signature_summary(signatures):
+    return [{'topic0': signature['topic0'], 'name': signature['name'], 'total': signature['total']}
+            for signature in signatures]
+
+
+async def interval_result(directory, manifest, request_type, bucket, selected_network, network_url):
+    # Signature datasets also return one stacked series per top topic0
+    if request_type == SIGNATURE_REQUEST_TYPE:
+        return await run_in_process(compute_signature_counts, directory, manifest)
+    interval_counts, interval_size = await bucketed_counts(
+        directory, manifest, bucket, selected_network, network_url)
+    return interval_counts, interval_size, []
+
+
+def fast_plot_layout(width, height, scale):
+    font_size = 9 * scale
+    if scale:
+        margins = (font_size * 7, font_size * 7, font_size * 3, font_size * 4)
+    else:
+        margins = (2, 2, 2, 2)
+    left, right, top, bottom = margins
+    return font_size, left, top, width - left - right, height - top - bottom
+
+
+def fast_plot_series(interval_counts, plot_width, plot_height):
+    # Shared scaling for both backends: bar heights on the primary axis and
+    # the cumulative line on the secondary axis, in plot pixel coordinates
+    counts = interval_counts['count'].to_numpy()
+    cumulative = interval_counts['cumulative'].to_numpy()
+    count_max = max(int(counts.max()), 1) * 1.05
+    cumulative_max = max(int(cumulative[-1]), 1) * 1.05
+    slot = plot_width / len(counts)
+    centers = (np.arange(len(counts)) + 0.5) * slot
+    bar_heights = counts / count_max * plot_height
+    line_y = plot_height - cumulative / cumulative_max * plot_height
+    return counts, slot, centers, bar_heights, line_y, count_max, cumulative_max
+
+
+def fast_plot_stacks(signatures, count_max, plot_height):
+    # Top of each signature's segment per interval, bottom segment first
+    return np.cumsum([signature['counts'] for signature in signatures], axis=0) / count_max * plot_height
+
+
+def signature_color(index):
+    return FAST_RENDER_SIGNATURE_COLORS[index % len(FAST_RENDER_SIGNATURE_COLORS)]
+
+
+def fast_plot_labels(interval_counts, interval_size, request_type, bucket, count_max, cumulative_max):
+    ticks = np.linspace(0, 1, 5)
+    starts = interval_counts['interval_start']
+    ends = interval_counts['interval_end']
+    return {
+        'title': bucket_title(request_type, bucket, interval_size),
+        'ticks': ticks,
+        'count_ticks': [format_with_commas(round(tick * count_max)) for tick in ticks],
+        'cumulative_ticks': [format_with_commas(round(tick * cumulative_max)) for tick in ticks],
+        'x_labels': [(position, format_with_commas(int(starts[index])) if bucket == 'block'
+                      else bucket_label(starts[index], ends[index], bucket))
+                     for position, index in ((0, 0), (0.5, len(starts) // 2), (1, len(starts) - 1))],
+    }
+
+
+def fast_plot_raster(interval_counts, interval_size, request_type, bucket, width, height, scale, image_format, signatures=()):
+    from PIL import Image, ImageDraw, ImageFont
+
+    font_size, left, top, plot_width, plot_height = fast_plot_layout(
+        width, height, scale)
+    counts, slot, centers, bar_heights, line_y, count_max, cumulative_max = fast_plot_series(
+        interval_counts, plot_width, plot_height)
+
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    plot = image[top:top + plot_height, left:left + plot_width]
+    rows = np.arange(plot_height)[:, None]
+
+    for tick in np.linspace(0, plot_height, 5)[1:]:
+        plot[max(int(plot_height - tick), 0)] = FAST_RENDER_COLORS['grid']
+
+    # One column per pixel: which interval it falls in and whether it is in
+    # the gap between bars
+    columns = np.arange(plot_width)
+    index = np.minimum((columns / slot).astype(np.int64), len(counts) - 1)
+    offset = columns / slot - index
+    in_bar = (offset >= 0.1) & (offset < 0.9) if slot >= 3 else True
+    if signatures:
+        # Paint the stacks from the top segment down, each over the ones above
+        stacks = fast_plot_stacks(signatures, count_max, plot_height)
+        for layer in reversed(range(len(signatures))):
+            column_heights = np.where(in_bar, stacks[layer][index], 0)
+            plot[rows >= plot_height - column_heights[None, :]] = signature_color(layer)
+    else:
+        column_heights = np.where(in_bar, bar_heights[index], 0)
+        bars = rows >= plot_height - column_heights[None, :]
+        plot[bars] = FAST_RENDER_COLORS['bar']
+        plot[bars & (index == counts.argmax())[None, :]
+             ] = FAST_RENDER_COLORS['max_bar']
+
+    # Cumulative line: interpolate per column and fill the vertical span to
+    # the previous column so steep segments stay connected
+    thickness = max(scale, 1)
+    line = np.interp(columns, centers, line_y)
+    previous = np.concatenate([line[:1], line[:-1]])
+    low = np.minimum(line, previous) - thickness / 2
+    high = np.maximum(line, previous) + thickness / 2
+    on_line = (rows >= low[None, :]) & (rows <= high[None, :]) & (
+        (columns >= centers[0]) & (columns <= centers[-1]))[None, :]
+    plot[on_line] = FAST_RENDER_COLORS['line']
+
+    picture = Image.fromarray(image)
+    if scale:
+        labels = fast_plot_labels(
+            interval_counts, interval_size, request_type, bucket, count_max, cumulative_max)
+        draw = ImageDraw.Draw(picture)
+        font = ImageFont.load_default(size=font_size)
+        title_font = ImageFont.load_default(size=font_size * 1.4)
+        color = FAST_RENDER_COLORS['text']
+        draw.text((width / 2, top / 2), labels['title'],
+                  fill=color, font=title_font, anchor='mm')
+        for tick, count_label, cumulative_label in zip(labels['ticks'], labels['count_ticks'], labels['cumulative_ticks']):
+            y = top + plot_height - tick * plot_height
+            draw.text((left - font_size / 2, y), count_label,
+                      fill=color, font=font, anchor='rm')
+            draw.text((left + plot_width + font_size / 2, y), cumulative_label,
+                      fill=FAST_RENDER_COLORS['line'], font=font, anchor='lm')
+        for position, label in labels['x_labels']:
+            draw.text((left + position * plot_width, top + plot_height + font_size), label,
+                      fill=color, font=font, anchor=('lt', 'mt', 'rt')[int(position * 2)])
+
+    buf = io.BytesIO()
+    if image_format == 'webp':
+        picture.save(buf, format='WEBP', quality=90)
+    else:
+        picture.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue()
+
+
+def fast_plot_svg(interval_counts, interval_size, request_type, bucket, width, height, scale, signatures=()):
+    font_size, left, top, plot_width, plot_height = fast_plot_layout(
+        width, height, scale)
+    counts, slot, centers, bar_heights, line_y, count_max, cumulative_max = fast_plot_series(
+        interval_counts, plot_width, plot_height)
+
+    def rgb(name):
+        return 'rgb({},{},{})'.format(*FAST_RENDER_COLORS[name])
+
+    bar_x = centers - slot * 0.4
+    bar_y = plot_height - bar_heights
+    if signatures:
+        # One path per signature segment; stacked bars keep their colours
+        stacks = fast_plot_stacks(signatures, count_max, plot_height)
+        bottoms = np.vstack([np.zeros(len(counts)), stacks[:-1]])
+        shapes = []
+        for layer, (tops, lows) in enumerate(zip(stacks, bottoms)):
+            segments = ''.join(f'M{x:.2f} {plot_height - high:.2f}h{slot * 0.8:.2f}V{plot_height - low:.2f}H{x:.2f}z'
+                               for x, high, low in zip(bar_x, tops, lows) if high > low)
+            shapes.append(f'<path d="{segments}" fill="{"rgb({},{},{})".format(*signature_color(layer))}"/>')
+    else:
+        max_index = counts.argmax()
+        bars = ''.join(f'M{x:.2f} {y:.2f}h{slot * 0.8:.2f}V{plot_height}H{x:.2f}z'
+                       for i, (x, y) in enumerate(zip(bar_x, bar_y)) if i != max_index)
+        shapes = [
+            f'<path d="{bars}" fill="{rgb("bar")}"/>',
+            f'<rect x="{bar_x[max_index]:.2f}" y="{bar_y[max_index]:.2f}" width="{slot * 0.8:.2f}" '
+            f'height="{bar_heights[max_index]:.2f}" fill="{rgb("max_bar")}"/>',
+        ]
+    grid = ''.join(f'M0 {y:.2f}H{plot_width}'
+                   for y in np.linspace(0, plot_height, 5)[:-1])
+    points = ' '.join(f'{x:.2f},{y:.2f}' for x, y in zip(centers, line_y))
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        '<rect width="100%" height="100%" fill="white"/>',
+        f'<g transform="translate({left},{top})">',
+        f'<path d="{grid}" stroke="{rgb("grid")}" fill="none"/>',
+        *shapes,
+        f'<polyline points="{points}" stroke="{rgb("line")}" stroke-width="{max(scale, 1)}" fill="none"/>',
+        '</g>',
+    ]
+    if scale:
+        labels = fast_plot_labels(
+            interval_counts, interval_size, request_type, bucket, count_max, cumulative_max)
+        text = f'font-family="sans-serif" font-size="{font_size}" fill="{rgb("text")}"'
+        parts.append(f'<text x="{width / 2}" y="{top / 2}" font-family="sans-serif" font-size="{font_size * 1.4}" '
+                     f'fill="{rgb("text")}" text-anchor="middle" dominant-baseline="middle">{labels["title"]}</text>')
+        for tick, count_label, cumulative_label in zip(labels['ticks'], labels['count_ticks'], labels['cumulative_ticks']):
+            y = top + plot_height - tick * plot_height
+            parts.append(f'<text x="{left - font_size / 2}" y="{y:.2f}" {text} '
+                         f'text-anchor="end" dominant-baseline="middle">{count_label}</text>')
+            parts.append(f'<text x="{left + plot_width + font_size / 2}" y="{y:.2f}" font-family="sans-serif" '
+                         f'font-size="{font_size}" fill="{rgb("line")}" dominant-baseline="middle">{cumulative_label}</text>')
+        for position, label in labels['x_labels']:
+            anchor = ('start', 'middle', 'end')[int(position * 2)]
+            parts.append(f'<text x="{left + position * plot_width:.2f}" y="{top + plot_height + font_size * 2}" '
+                         f'{text} text-anchor="{anchor}">{label}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def render_fast_plot(directory, manifest, request_type, image_format, preset, bucket='block', selected_network=None):
+    # Signature datasets are only requested per block interval and stack
+    # one segment per top topic0
+    signatures = ()
+    if request_type == SIGNATURE_REQUEST_TYPE:
+        interval_counts, interval_size, signatures = compute_signature_counts(
+            directory, manifest)
+    else:
+        interval_counts, interval_size = bucket_counts(
+            directory, manifest, bucket, selected_network)
+    width, height, scale = FAST_RENDER_PRESETS[preset]
+    with timed('render'):
+        if image_format == 'svg':
+            return fast_plot_svg(interval_counts, interval_size, request_type, bucket,
+                                 width, height, scale, signatures).encode()
+        return fast_plot_raster(interval_counts, interval_size, request_type, bucket,
+                                width, height, scale, image_format, signatures)
+
+
+def histogram_to_ipc(interval_counts, metadata, signatures=()):
+    table = interval_counts.select(
+        ['interval_start', 'interval_end', 'count', 'cumulative']).with_columns([
+            pl.Series(signature_key(signature), signature['counts'])
+            for signature in signatures]).to_arrow()
+    table = table.replace_schema_metadata(
+        {'metadata': json.dumps(metadata)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def create_plot(directory, request_type, total_blocks, total_items, elapsed_time, start_block, is_cached, bucket='block', selected_network=None):
     logger.info("Starting create_plot function")
+    # Imported on first use so workers start fast: matplotlib and pandas take
+    # longer to import than the rest of the app together
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+    import pandas as pd
+    from matplotlib.patches import Patch
+
     # Even larger size and higher resolution
     plt.figure(figsize=(30, 15), dpi=120)
     logger.info("Created figure with size (30, 15) and dpi=120")
@@ -367,101 +3442,54 @@ def create_plot(directory, request_type, total_blocks, total_items, elapsed_time
         'figure.titlesize': 24
     })
 
-    is_event_request = request_type == "event"
+    is_event_request = is_event_type(request_type)
     file_suffix = 'logs' if is_event_request else 'transactions'
     logger.info(f"Request type: {request_type}, file_suffix: {file_suffix}")
 
     logger.info(f"Analyzing data from directory: {directory}")
     try:
-        logger.info(f"Attempting to read file: {
-                    directory}/{file_suffix}.parquet")
-        df = pl.read_parquet(f"{directory}/{file_suffix}.parquet")
-        logger.info(f"Data read successfully, DataFrame shape: {df.shape}")
+        # Take one manifest snapshot so every pass sees the same segments
+        manifest = load_manifest(directory)
+        if not manifest or not manifest['segments']:
+            raise ValueError(f"No data found in {directory}")
+        logger.info(f"Scanning {len(manifest['segments'])} segments")
     except Exception as e:
         logger.error(f"Error reading Parquet file: {str(e)}", exc_info=True)
         raise
 
-    min_block = df['block_number'].min()
-    max_block = df['block_number'].max()
-    logger.info(f"Min block: {min_block}, Max block: {max_block}")
-
-    interval_size = max(5000, round_based_on_magnitude(
-        (max_block - min_block) / 50))
-    logger.info(f"Calculated interval size: {interval_size}")
-
-    min_block_rounded = min_block - (min_block % interval_size)
-    intervals = np.arange(min_block_rounded, max_block +
-                          interval_size, interval_size)
-    logger.info(f"Created intervals, first: {
-                intervals[0]}, last: {intervals[-1]}, total intervals: {len(intervals)}")
+    max_block = manifest['max_block']
+    logger.info(f"Min block: {manifest['min_block']}, Max block: {max_block}")
 
     logger.info("Calculating interval counts")
-    log_memory_usage()
-
     try:
-        chunk_size = 1_000_000  # Adjust this value based on your available memory
-        interval_counts = None
-
-        for chunk in df.iter_slices(chunk_size):
-            logger.info(f"Processing chunk of size {len(chunk)}")
-            chunk = chunk.with_columns([
-                ((pl.col('block_number') - min_block_rounded) /
-                 interval_size).floor().cast(pl.Int64).alias('interval_index')
-            ])
-            chunk_counts = chunk.group_by(
-                'interval_index').agg(pl.len().alias('count'))
-
-            logger.info(f"Chunk interval indices: min={
-                        chunk_counts['interval_index'].min()}, max={chunk_counts['interval_index'].max()}")
-
-            if interval_counts is None:
-                interval_counts = chunk_counts
-            else:
-                interval_counts = pl.concat([interval_counts, chunk_counts])
-
-            log_memory_usage()
-
-        interval_counts = interval_counts.group_by(
-            'interval_index').agg(pl.sum('count')).sort('interval_index')
-        logger.info(f"Grouped by interval_index, shape: {
-                    interval_counts.shape}")
-        logger.info(f"Interval indices: min={interval_counts['interval_index'].min()}, max={
-                    interval_counts['interval_index'].max()}")
-
-        full_range = pl.DataFrame(
-            {'interval_index': pl.arange(0, len(intervals)-1, eager=True)})
-        interval_counts = full_range.join(
-            interval_counts, on='interval_index', how='left').fill_null(0)
-
-        interval_counts = interval_counts.with_columns([
-            (pl.col('interval_index') * interval_size +
-             min_block_rounded).alias('interval_start'),
-            ((pl.col('interval_index') + 1) * interval_size +
-             min_block_rounded).alias('interval_end')
-        ])
-        logger.info(f"Added interval boundaries, final shape: {
-                    interval_counts.shape}")
-        logger.info(f"First few rows of interval_counts:\n{
-                    interval_counts.head()}")
-        logger.info(f"Last few rows of interval_counts:\n{
-                    interval_counts.tail()}")
-        log_memory_usage()
-
+        signatures = None
+        if request_type == SIGNATURE_REQUEST_TYPE and bucket == 'block':
+            interval_counts, interval_size, signatures = compute_signature_counts(
+                directory, manifest)
+        else:
+            interval_counts, interval_size = bucket_counts(
+                directory, manifest, bucket, selected_network)
+        logger.info(f"Calculated interval size: {interval_size}, intervals: {
+                    len(interval_counts)}")
     except Exception as e:
         logger.error(f"Error during interval count calculation: {
                      str(e)}", exc_info=True)
         log_memory_usage()
         raise
 
+    render_start = time.perf_counter()
     # Convert to pandas for plotting
     try:
         interval_counts_pd = interval_counts.to_pandas()
-        interval_counts_pd['interval'] = interval_counts_pd.apply(
-            lambda row: f"{row['interval_start']}-{row['interval_end']}", axis=1)
+        if bucket == 'block':
+            interval_counts_pd['interval'] = [
+                f"{start}-{end}" for start, end in zip(interval_counts['interval_start'], interval_counts['interval_end'])]
+        else:
+            interval_counts_pd['interval'] = [
+                bucket_label(start, end, bucket) for start, end in zip(interval_counts['interval_start'], interval_counts['interval_end'])]
         interval_counts_pd.set_index('interval', inplace=True)
         logger.info(f"Converted to pandas DataFrame, shape: {
                     interval_counts_pd.shape}")
-        log_memory_usage()
     except Exception as e:
         logger.error(f"Error converting to pandas: {str(e)}", exc_info=True)
         log_memory_usage()
@@ -477,8 +3505,17 @@ def create_plot(directory, request_type, total_blocks, total_items, elapsed_time
     grid_color = '#f3f4f6'  # Even lighter gray for less intense grid
 
     # Plot with enhanced styling
-    ax = interval_counts_pd['count'].plot(
-        kind='bar', color=bar_color, edgecolor='none', alpha=0.8, width=0.8)
+    if signatures:
+        # One stacked segment per signature, in descending order of volume
+        signature_colors = [plt.cm.tab10(i % 10) for i in range(len(signatures))]
+        stacked = pd.DataFrame(
+            {signature['name']: signature['counts'] for signature in signatures},
+            index=interval_counts_pd.index)
+        ax = stacked.plot(kind='bar', stacked=True, color=signature_colors, ax=plt.gca(),
+                          edgecolor='none', alpha=0.8, width=0.8, legend=False)
+    else:
+        ax = interval_counts_pd['count'].plot(
+            kind='bar', color=bar_color, edgecolor='none', alpha=0.8, width=0.8)
 
     # Customize grid - make it much lighter
     ax.grid(axis='y', linestyle='--', alpha=0.4, color=grid_color)
@@ -491,18 +3528,17 @@ def create_plot(directory, request_type, total_blocks, total_items, elapsed_time
     ax.spines['bottom'].set_alpha(0.3)
 
     ylabel = 'Number of Events' if is_event_request else 'Number of Transactions'
-    title = (f'Number of Events per Block Interval (Size {format_with_commas(interval_size)})'
-             if is_event_request
-             else f'Number of Transactions per Block Interval (Size {format_with_commas(interval_size)})')
+    title = bucket_title(request_type, bucket, interval_size)
 
     logger.info(f"Setting labels and title. Y-label: {ylabel}")
-    plt.xlabel('Block Number Interval', fontsize=18, labelpad=12)
+    plt.xlabel('Block Number Interval' if bucket == 'block' else 'Time (UTC)',
+               fontsize=18, labelpad=12)
     plt.ylabel(ylabel, fontsize=18, labelpad=12)
     plt.title(title, fontsize=24, pad=20, fontweight='bold')
 
     logger.info("Setting x-axis ticks and labels")
-    x_labels = [f"{format_with_commas(int(left))}-{format_with_commas(int(right))}"
-                for left, right in zip(intervals[:-1], intervals[1:])]
+    x_labels = [bucket_label(left, right, bucket)
+                for left, right in zip(interval_counts['interval_start'], interval_counts['interval_end'])]
 
     # Show fewer x-axis labels for better readability
     max_labels = 15  # Even fewer labels for better readability
@@ -537,9 +3573,15 @@ def create_plot(directory, request_type, total_blocks, total_items, elapsed_time
         ticker.FuncFormatter(lambda x, p: format_with_commas(x)))
 
     # Create legend - position it at the top right instead of top left
-    legend_elements = [
-        Patch(facecolor=bar_color, edgecolor='none', alpha=0.8,
-              label=f'{"Events" if is_event_request else "Transactions"} per Interval'),
+    if signatures:
+        legend_elements = [
+            Patch(facecolor=color, edgecolor='none', alpha=0.8, label=signature['name'])
+            for signature, color in zip(signatures, signature_colors)]
+    else:
+        legend_elements = [
+            Patch(facecolor=bar_color, edgecolor='none', alpha=0.8,
+                  label=f'{"Events" if is_event_request else "Transactions"} per Interval')]
+    legend_elements += [
         plt.Line2D([0], [0], color=line_color, marker='o', markersize=6,
                    linewidth=3, alpha=0.8, label='Cumulative Total')
     ]
@@ -556,8 +3598,9 @@ def create_plot(directory, request_type, total_blocks, total_items, elapsed_time
 
     # Get the existing bar patches
     bars = [p for p in ax.patches]
-    # Change the color of the maximum bar
-    if len(bars) > max_idx:
+    # Change the color of the maximum bar; stacked bars keep their
+    # signature colours
+    if not signatures and len(bars) > max_idx:
         bars[max_idx].set_color('#e53e3e')  # Highlight color
         bars[max_idx].set_edgecolor('none')
 
@@ -579,34 +3622,56 @@ def create_plot(directory, request_type, total_blocks, total_items, elapsed_time
     logger.info("Saving plot to BytesIO buffer")
     buf = io.BytesIO()
     plt.savefig(buf, format='png', bbox_inches='tight')
+    # Figures otherwise accumulate in long-lived pool workers
+    plt.close('all')
+    record_stage('render', time.perf_counter() - render_start)
     buf.seek(0)
-    plot_url = base64.b64encode(buf.read()).decode('utf-8')
+    with timed('encode'):
+        plot_url = base64.b64encode(buf.read()).decode('utf-8')
     buf.close()
     logger.info("Plot saved and encoded")
 
-    is_event = request_type == "event"
+    stats = build_stats(request_type, total_blocks, total_items,
+                        elapsed_time, start_block, is_cached, max_block)
+
+    logger.info("create_plot function completed")
+    return f'data:image/png;base64,{plot_url}', stats
+
+
+def build_stats(request_type, total_blocks, total_items, elapsed_time, start_block, is_cached, max_block):
+    is_event = is_event_type(request_type)
     item_type = "Events" if is_event else "Transactions"
     logger.info(f"Item type: {item_type}")
 
     if start_block == 0:
-        total_blocks = max(total_blocks, df['block_number'].max())
+        total_blocks = max(total_blocks, max_block)
     logger.info(f"Total blocks: {total_blocks}")
 
     logger.info("Preparing stats dictionary")
-    stats = {
-        'total_blocks': format_with_commas(total_blocks),
-        'total_items': format_with_commas(total_items),
-        'elapsed_time': f"{elapsed_time:.2f}",
-        'blocks_per_second': format_with_commas(round(total_blocks / elapsed_time)),
-        'items_per_second': format_with_commas(round(total_items / elapsed_time)),
-        'is_event': is_event,
-        'is_cached': is_cached
-    }
+    with timed('stats'):
+        stats = {
+            'total_blocks': format_with_commas(total_blocks),
+            'total_items': format_with_commas(total_items),
+            # Rates are not applicable when answered from the last synced state
+            'elapsed_time': 'n/a' if elapsed_time is None else f"{elapsed_time:.2f}",
+            'blocks_per_second': format_with_commas(round(total_blocks / elapsed_time)) if elapsed_time else 'n/a',
+            'items_per_second': format_with_commas(round(total_items / elapsed_time)) if elapsed_time else 'n/a',
+            'is_event': is_event,
+            'is_cached': is_cached
+        }
     logger.info("Stats dictionary created")
-
-    logger.info("create_plot function completed")
-    return f'data:image/png;base64,{plot_url}', stats
+    return stats
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    if SERVE_WORKERS > 1:
+        # Each hypercorn worker imports this module and they share data/
+        from hypercorn.config import Config
+        from hypercorn.run import run
+        config = Config()
+        config.bind = [f"0.0.0.0:{os.environ.get('PORT', '5001')}"]
+        config.workers = SERVE_WORKERS
+        config.application_path = 'app:app'
+        run(config)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=5001)
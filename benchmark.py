@@ -0,0 +1,313 @@
+"""End-to-end benchmarks for the fetch, sort, binning and render paths.
+
+Runs entirely offline: HyperSync is replaced by a local stand-in serving
+synthetic datasets, so results are reproducible across machines and runs.
+
+    python benchmark.py --sizes 1000,1000000,10000000 > bench_output.txt
+
+Results are printed as one JSON document with latency, throughput and peak
+RSS (including worker processes) per benchmark and dataset size.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import polars as pl
+import psutil
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BENCH_NETWORK = 'bench'
+BENCH_URL = 'http://hypersync.bench.local'
+# Keep everything in this process by default so peak RSS is easy to attribute
+BENCH_ENV_DEFAULTS = {
+    'PROCESS_POOL_WORKERS': '0',
+    'WARM_CACHE_SIZE': '0',
+    'JOB_WORKERS': '0',
+    'JOB_MIN_AVAILABLE_MB': '0',
+    'DATA_CACHE_SWEEP_SECONDS': '3600',
+}
+
+
+def generate_blocks(rows, head, seed=0, chunk_rows=10_000_000):
+    """Yield sorted chunks of block numbers with realistic skew.
+
+    Activity ramps up towards the chain head, with a few hundred bursts
+    (launches, airdrops, mints) packing many events into short block ranges.
+    """
+    rng = np.random.default_rng(seed)
+    bursts = np.sort(rng.beta(3, 1.5, 200) * head)
+    burst_widths = rng.lognormal(7, 1.5, len(bursts))
+    # Chunks cover disjoint block ranges so the whole stream is sorted
+    chunks = max(1, -(-rows // chunk_rows))
+    for i in range(chunks):
+        low, high = head * i // chunks, head * (i + 1) // chunks
+        count = rows // chunks + (1 if i < rows % chunks else 0)
+        background = rng.beta(3, 1.5, count // 2)
+        background = low + (background * (high - low)).astype(np.int64)
+        burst = rng.choice(len(bursts), count - len(background))
+        burst = (bursts[burst] + rng.normal(0, 1, len(burst))
+                 * burst_widths[burst]).astype(np.int64)
+        burst = np.where((burst >= low) & (burst < high), burst,
+                         rng.integers(low, max(high, low + 1), len(burst)))
+        yield np.sort(np.concatenate([background, burst]))
+
+
+def write_synthetic_dataset(path, rows, head, seed=0):
+    writer = None
+    for blocks in generate_blocks(rows, head, seed):
+        table = pa.table({'block_number': pa.array(blocks, pa.int64())})
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+class FakeHypersyncClient:
+    """Local stand-in for hypersync.HypersyncClient.
+
+    Serves block numbers for registered addresses from synthetic parquet
+    files, honouring the query's block range. Rows are shuffled within each
+    written batch, like upstream output, so sorting is exercised.
+    """
+    sources = {}
+    head = 0
+    latency = 0.0
+
+    def __init__(self, config=None):
+        pass
+
+    @classmethod
+    def register(cls, address, path):
+        cls.sources[address] = path
+
+    async def get_height(self):
+        await asyncio.sleep(self.latency)
+        return self.head
+
+    async def collect_parquet(self, path, query, config):
+        await asyncio.sleep(self.latency)
+        addresses = []
+        for selection in query.logs or []:
+            addresses += selection.address or []
+        for selection in query.transactions or []:
+            addresses += (selection.from_ or []) + (selection.to or [])
+
+        to_block = getattr(query, 'to_block', None) or self.head + 1
+        selected = query.field_selection.log or query.field_selection.transaction or []
+        with_address = any('address' in str(field).lower() for field in selected)
+        name = 'logs' if query.logs else 'transactions'
+        writer = None
+        # Stream one source row group at a time so memory stays bounded by
+        # the row group size rather than the requested range
+        for address in dict.fromkeys(addresses):
+            if address not in self.sources:
+                continue
+            source = pq.ParquetFile(self.sources[address])
+            for index in range(source.num_row_groups):
+                stats = source.metadata.row_group(index).column(0).statistics
+                if stats is not None and stats.has_min_max and (
+                        stats.max < query.from_block or stats.min >= to_block):
+                    continue
+                frame = pl.from_arrow(source.read_row_group(index)).filter(
+                    pl.col('block_number').is_between(query.from_block, to_block, closed='left'))
+                if frame.is_empty():
+                    continue
+                if with_address:
+                    frame = frame.with_columns(pl.lit(address).alias('address'))
+                table = frame.sample(fraction=1.0, shuffle=True, seed=index).to_arrow()
+                if writer is None:
+                    os.makedirs(path, exist_ok=True)
+                    writer = pq.ParquetWriter(f'{path}/{name}.parquet', table.schema)
+                writer.write_table(table)
+        if writer is not None:
+            writer.close()
+
+
+class PeakRSS:
+    """Sample the RSS of this process and its children in the background."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _rss(self):
+        process = psutil.Process(os.getpid())
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+async def measure(results, benchmark, rows, coro_or_func, *args):
+    # rows may be a callable, for runs whose row count is only known after
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        if asyncio.iscoroutinefunction(coro_or_func):
+            value = await coro_or_func(*args)
+        else:
+            value = coro_or_func(*args)
+        seconds = time.perf_counter() - start
+    if callable(rows):
+        rows = rows()
+    result = {
+        'benchmark': benchmark,
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(rss.peak / 1024 / 1024, 1),
+    }
+    results.append(result)
+    print(f"{benchmark:>24} {rows:>12,} rows {seconds:10.3f}s "
+          f"{result['peak_rss_mb']:10.1f} MB", file=sys.stderr)
+    return value
+
+
+async def run_size(app, rows, head, incremental_fraction, results):
+    address = f'0x{rows:040x}'
+    source_path = f'source_{rows}.parquet'
+    write_synthetic_dataset(source_path, rows, head, seed=rows)
+    FakeHypersyncClient.register(address, source_path)
+
+    def stored_rows():
+        manifest = app.load_manifest(app.dataset_directory(address, BENCH_NETWORK, 'event'))
+        return manifest['row_count'] if manifest else 0
+
+    # Cold fetch up to an earlier head, then an incremental catch-up. Each
+    # reports the rows it actually added, not the size of the source.
+    FakeHypersyncClient.head = int(head * (1 - incremental_fraction))
+    await measure(results, 'fetch_cold', stored_rows, app.fetch_data,
+                  address, BENCH_NETWORK, BENCH_URL, 'event', None, True)
+    FakeHypersyncClient.head = head
+    cold_rows = stored_rows()
+    directory, total_blocks, total_items, elapsed_time, start_block, is_cached = await measure(
+        results, 'fetch_incremental', lambda: stored_rows() - cold_rows, app.fetch_data,
+        address, BENCH_NETWORK, BENCH_URL, 'event', None, True)
+
+    sorted_path = f'sorted_{rows}.parquet'
+    await measure(results, 'sort', rows, app.process_and_write_in_chunks,
+                  source_path, sorted_path)
+    os.remove(sorted_path)
+
+    manifest = app.load_manifest(directory)
+    await measure(results, 'binning', total_items,
+                  app.compute_interval_counts, directory, manifest)
+    await measure(results, 'render', total_items, app.create_plot,
+                  directory, 'event', total_blocks, total_items, elapsed_time, start_block, is_cached)
+
+    client = app.app.test_client()
+    for response_format in ('json', 'png'):
+        app.RENDER_CACHE = app.RenderCache(0, 0, app.RENDER_CACHE_DIR)
+
+        async def api_request():
+            response = await client.post('/api/data', json={
+                'address': address, 'network': BENCH_NETWORK,
+                'type': 'event', 'format': response_format})
+            assert response.status_code == 200, await response.get_data()
+        await measure(results, f'api_data_{response_format}', total_items, api_request)
+
+
+async def run(args):
+    import hypersync
+    hypersync.HypersyncClient = FakeHypersyncClient
+    FakeHypersyncClient.latency = args.latency_ms / 1000
+
+    import app
+
+    async def fetch_chain_data():
+        return {BENCH_NETWORK: {'chain_id': 0, 'url': BENCH_URL}}
+    app.fetch_chain_data = fetch_chain_data
+
+    results = []
+    async with app.app.test_app():
+        for rows in args.sizes:
+            await run_size(app, rows, args.head, args.incremental_fraction, results)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help='comma separated dataset sizes in rows (up to 500M)')
+    parser.add_argument('--head', type=int, default=20_000_000,
+                        help='synthetic chain head block')
+    parser.add_argument('--incremental-fraction', type=float, default=0.01,
+                        help='share of the chain fetched by the incremental run')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='simulated upstream latency per request')
+    parser.add_argument('--workdir', help='keep datasets in this directory')
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(',')]
+
+    for name, value in BENCH_ENV_DEFAULTS.items():
+        os.environ.setdefault(name, value)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='chaindensity-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    json.dump({
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'polars': pl.__version__,
+            'pyarrow': pa.__version__,
+        },
+        'config': {
+            'head': args.head,
+            'incremental_fraction': args.incremental_fraction,
+            'latency_ms': args.latency_ms,
+            **{name: os.environ[name] for name in BENCH_ENV_DEFAULTS},
+        },
+        'results': results,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,8 @@ interface ResultsDisplayProps {
     network: string;
     total_blocks: number;
     total_items: number;
-    elapsed_time: number;
+    // null when answered from the last synced state without fetching
+    elapsed_time: number | null;
     cached?: boolean;
   };
   onClear: () => void;
@@ -112,7 +113,9 @@ export default function ResultsDisplay({
             </div>
             <div className="flex items-center gap-2 md:mr-8">
               <div className="text-xs bg-gray-100/80 px-3 py-1.5 rounded-full text-gray-600">
-                Completed in {result.elapsed_time.toFixed(2)}s
+                {result.elapsed_time === null
+                  ? "Served from synced data"
+                  : `Completed in ${result.elapsed_time.toFixed(2)}s`}
               </div>
             </div>
           </div>
@@ -200,25 +203,33 @@ export default function ResultsDisplay({
               {/* Elapsed Time */}
               <StatsCard
                 title="Elapsed Time (seconds)"
-                value={result.elapsed_time.toFixed(2)}
+                value={result.elapsed_time?.toFixed(2) ?? "n/a"}
                 icon="time"
               />
 
               {/* Blocks per Second */}
               <StatsCard
                 title="Blocks per Second"
-                value={Math.round(
-                  result.total_blocks / result.elapsed_time
-                ).toLocaleString()}
+                value={
+                  result.elapsed_time
+                    ? Math.round(
+                        result.total_blocks / result.elapsed_time
+                      ).toLocaleString()
+                    : "n/a"
+                }
                 icon="density"
               />
 
               {/* Events/Transactions per Second */}
               <StatsCard
                 title={`${result.request_type === "event" ? "Events" : "Transactions"} per Second`}
-                value={Math.round(
-                  result.total_items / result.elapsed_time
-                ).toLocaleString()}
+                value={
+                  result.elapsed_time
+                    ? Math.round(
+                        result.total_items / result.elapsed_time
+                      ).toLocaleString()
+                    : "n/a"
+                }
                 icon="density"
               />
             </div>